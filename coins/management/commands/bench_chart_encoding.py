@@ -0,0 +1,52 @@
+import json
+import math
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from coins.services import packed
+
+
+def synthetic_series(n, step_ms=300_000):
+    """Passeio aleatório com timestamps espaçados como os da CoinGecko."""
+    ts, price, out = 1_700_000_000_000, 30_000.0, []
+    for _ in range(n):
+        ts += step_ms + random.randint(-500, 500)
+        price *= math.exp(random.gauss(0, 0.002))
+        out.append([ts, price])
+    return out
+
+
+class Command(BaseCommand):
+    help = "Compara bytes e tempo de encode/decode da série do /chart/: JSON vs formato binário (packed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="288,500,2000,8000", help="tamanhos de série (pontos), separados por vírgula")
+        parser.add_argument("--repeat", type=int, default=200)
+        parser.add_argument("--coin", help="usa a série local de uma moeda (services/series.py) em vez da sintética")
+        parser.add_argument("--days", default="max")
+
+    def handle(self, *args, **opts):
+        if opts["coin"]:
+            from coins.services import series
+            cases = [(opts["coin"], series.get_range(opts["coin"], opts["days"]))]
+        else:
+            cases = [(str(n), synthetic_series(int(n))) for n in opts["sizes"].split(",")]
+
+        repeat = opts["repeat"]
+        self.stdout.write(f"{'série':>10} {'fmt':>6} {'bytes':>9} {'encode µs':>10} {'decode µs':>10}")
+        for name, prices in cases:
+            payload = {"prices": prices, "cached": True}
+            as_json = json.dumps(payload, separators=(",", ":")).encode()
+            as_bin = packed.pack(prices)
+            rows = (
+                ("json", as_json,
+                 lambda: json.dumps(payload, separators=(",", ":")).encode(), lambda: json.loads(as_json)),
+                ("bin", as_bin, lambda: packed.pack(prices), lambda: packed.unpack(as_bin)),
+            )
+            for fmt, blob, encode, decode in rows:
+                enc = timeit.timeit(encode, number=repeat) / repeat * 1e6
+                dec = timeit.timeit(decode, number=repeat) / repeat * 1e6
+                self.stdout.write(f"{name:>10} {fmt:>6} {len(blob):>9} {enc:>10.1f} {dec:>10.1f}")
+            self.stdout.write(f"{'':>10} {'ratio':>6} {len(as_json) / max(len(as_bin), 1):>9.1f}x")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from coins.models import CoinMetadata
+from coins.tasks import refresh_coin_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga inicial do catálogo (CoinMetadata): se estiver vazio, enfileira o "
+        "refresh_coin_catalog em vez de esperar a primeira execução agendada do Beat."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sync", action="store_true", help="roda o refresh aqui mesmo em vez de enfileirar")
+
+    def handle(self, *args, **opts):
+        if CoinMetadata.objects.exists():
+            self.stdout.write("catálogo já carregado")
+            return
+        if opts["sync"]:
+            self.stdout.write(f"catálogo carregado: {refresh_coin_catalog()}")
+            return
+        result = refresh_coin_catalog.delay()
+        self.stdout.write(f"catálogo vazio: refresh_coin_catalog enfileirado ({result.id})")
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-18 08:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coins', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoinMetadata',
+            fields=[
+                ('coin_id', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('symbol', models.CharField(max_length=100)),
+                ('name', models.CharField(max_length=255)),
+                ('image', models.URLField(blank=True, default='', max_length=500)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
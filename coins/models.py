@@ -4,3 +4,15 @@ class CoinPriceCache(models.Model):
     coin_id = models.CharField(max_length=100, unique=True)
     price_usd = models.DecimalField(max_digits=20, decimal_places=2)
     updated_at = models.DateTimeField(auto_now=True)
+
+class CoinMetadata(models.Model):
+    """
+    Catálogo local de moedas (id, símbolo, nome, imagem) para enriquecer
+    favoritos, holdings e alertas sem chamar a CoinGecko no POST.
+    Preenchido pela task refresh_coin_catalog (/coins/list + universo de mercado).
+    """
+    coin_id = models.CharField(max_length=100, primary_key=True)
+    symbol = models.CharField(max_length=100)
+    name = models.CharField(max_length=255)
+    image = models.URLField(max_length=500, blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,27 @@
+import json
+
+from rest_framework import renderers
+
+from .services import packed
+
+
+class PackedSeriesRenderer(renderers.BaseRenderer):
+    """
+    Série do /chart/ no formato binário de services/packed.py
+    (?format=bin ou Accept: application/vnd.cryptotracker.series).
+    Respostas de erro continuam saindo em JSON.
+    """
+    media_type = packed.MEDIA_TYPE
+    format = packed.FORMAT
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data  # blob já empacotado vindo do cache
+        if isinstance(data, dict) and "prices" in data:
+            return packed.pack(data["prices"])
+        response = (renderer_context or {}).get("response")
+        if response is not None:
+            response["Content-Type"] = "application/json"
+        return json.dumps(data).encode()
@@ -0,0 +1,138 @@
+import os
+import time
+import logging
+from typing import Dict, Tuple
+
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker da CoinGecko, com estado compartilhado (hash no Redis) por
+# todos os processos web e Celery:
+#   closed    -> chamadas passam; FAILURES falhas seguidas (rede/5xx) abrem;
+#   open      -> ninguém chama o upstream por COOLDOWN s (falha imediata);
+#   half_open -> passado o cooldown, UMA chamada de teste passa: sucesso
+#                fecha, falha reabre por mais COOLDOWN s.
+# Cada processo guarda localmente até quando o circuito está aberto, então
+# enquanto ele estiver aberto a recusa não custa nem um round-trip ao Redis.
+FAILURES = int(os.getenv("COINGECKO_BREAKER_FAILURES", "5"))
+COOLDOWN = float(os.getenv("COINGECKO_BREAKER_COOLDOWN", "30"))  # segundos
+PROBE_TTL = float(os.getenv("COINGECKO_TIMEOUT", "10")) + 1      # prazo da chamada de teste
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_KEY = cache.key("breaker", "coingecko")
+
+# Retorna {permitido, segundos até a próxima tentativa}. Sem hash = closed.
+_ALLOW_LUA = """
+local now = redis.call('TIME')
+local t = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'state', 'until')
+local until_ = tonumber(state[2]) or 0
+if state[1] == 'open' or state[1] == 'half_open' then
+  if t < until_ then
+    return {0, tostring(until_ - t)}
+  end
+  -- cooldown (ou prazo da chamada de teste) acabou: este caller é o teste
+  redis.call('HSET', KEYS[1], 'state', 'half_open', 'until', tostring(t + tonumber(ARGV[1])))
+end
+return {1, '0'}
+"""
+
+# Conta uma falha; abre o circuito no limite (ou se era a chamada de teste).
+# Retorna os segundos de cooldown se abriu, 0 caso contrário.
+_FAILURE_LUA = """
+local now = redis.call('TIME')
+local t = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local state = redis.call('HGET', KEYS[1], 'state')
+if state == 'open' then
+  return '0'
+end
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+if state == 'half_open' or failures >= tonumber(ARGV[1]) then
+  local cooldown = tonumber(ARGV[2])
+  redis.call('HSET', KEYS[1], 'state', 'open', 'until', tostring(t + cooldown), 'failures', 0,
+             'opened_at', tostring(t))
+  redis.call('EXPIRE', KEYS[1], math.ceil(cooldown) * 10 + 60)
+  return tostring(cooldown)
+end
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2])) * 10 + 60)
+return '0'
+"""
+
+# Sucesso: volta a closed (apaga o hash) se havia falhas ou teste em andamento.
+_SUCCESS_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  redis.call('DEL', KEYS[1])
+  return 1
+end
+return 0
+"""
+
+_allow_script = cache.client().register_script(_ALLOW_LUA)
+_failure_script = cache.client().register_script(_FAILURE_LUA)
+_success_script = cache.client().register_script(_SUCCESS_LUA)
+
+# monotonic até quando este processo já sabe que o circuito está aberto
+_open_until = 0.0
+
+
+def _remember_open(wait: float) -> None:
+    global _open_until
+    _open_until = max(_open_until, time.monotonic() + wait)
+
+
+def allow() -> Tuple[bool, float]:
+    """
+    Pode chamar o upstream agora? Retorna (False, espera_em_s) com o circuito
+    aberto (ou com a chamada de teste de outro processo em andamento).
+    Se o Redis falhar, libera (como o rate limiter).
+    """
+    remaining = _open_until - time.monotonic()
+    if remaining > 0:
+        return False, remaining
+    try:
+        allowed, wait = _allow_script(keys=[_KEY], args=[PROBE_TTL])
+    except Exception as exc:
+        logger.warning("circuit breaker indisponível (%s); seguindo sem ele", exc)
+        return True, 0.0
+    if not int(allowed):
+        _remember_open(float(wait))
+        return False, float(wait)
+    return True, 0.0
+
+
+def record_failure() -> None:
+    try:
+        opened = float(_failure_script(keys=[_KEY], args=[FAILURES, COOLDOWN]))
+    except Exception as exc:
+        logger.warning("circuit breaker indisponível (%s)", exc)
+        return
+    if opened:
+        _remember_open(opened)
+        logger.error("CoinGecko falhando: circuito aberto por %.0fs", opened)
+
+
+def record_success() -> None:
+    global _open_until
+    try:
+        closed = _success_script(keys=[_KEY])
+    except Exception as exc:
+        logger.warning("circuit breaker indisponível (%s)", exc)
+        return
+    _open_until = 0.0
+    if int(closed):
+        logger.info("CoinGecko respondeu: circuito fechado")
+
+
+def stats() -> Dict[str, object]:
+    """Estado atual (para o /api/health/)."""
+    raw = {k.decode(): v.decode() for k, v in cache.client().hgetall(_KEY).items()}
+    state = raw.get("state", CLOSED)
+    out: Dict[str, object] = {
+        "state": state,
+        "failures": int(raw.get("failures", 0)),
+    }
+    if state != CLOSED:
+        out["until"] = float(raw["until"])
+    return out
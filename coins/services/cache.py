@@ -1,9 +1,122 @@
-import os, json, time, redis
+import os, json, time, uuid, asyncio, hashlib, logging, threading, functools, redis
+from collections import OrderedDict
 
 _redis = redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"))
 
+logger = logging.getLogger(__name__)
+
+# Stale-while-revalidate: cada entrada tem um TTL "soft" (o TTL configurado;
+# depois dele o valor está velho) e um "hard" = soft + CACHE_STALE_TTL (quando
+# o Redis apaga a chave). Entre os dois o valor velho é servido na hora e um
+# refresh em background é enfileirado (no máximo um por chave a cada
+# REFRESH_LOCK_TTL segundos).
+STALE_TTL = int(os.getenv("CACHE_STALE_TTL", "600"))
+REFRESH_LOCK_TTL = 30
+# Entradas marcadas last_known (detalhe e gráfico na resolução padrão, não
+# cada variante de points/formato) ficam mais DEGRADED_TTL s no Redis depois
+# da janela stale, só como último valor conhecido: são buscadas de novo
+# normalmente e só voltam a ser servidas (estado DEGRADED) se essa busca
+# falhar (upstream fora do ar).
+DEGRADED_TTL = int(os.getenv("CACHE_DEGRADED_TTL", "21600"))
+
+HIT, STALE, MISS, DEGRADED = "hit", "stale", "miss", "degraded"
+
+# L1: LRU em memória (por processo) na frente do Redis para as entradas SWR,
+# evitando GET + json.loads nas chaves quentes. Toda escrita publica a chave
+# em INVALIDATE_CHANNEL e cada processo a remove do seu L1; o TTL curto do L1
+# limita a defasagem mesmo se uma mensagem de pub/sub se perder.
+L1_SIZE = int(os.getenv("CACHE_L1_SIZE", "512"))
+L1_TTL = float(os.getenv("CACHE_L1_TTL", "1.0"))
+INVALIDATE_CHANNEL = "ct:cache:invalidate"
+
+
+class _LRU:
+    def __init__(self, size, ttl):
+        self.size, self.ttl = size, ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, k):
+        with self._lock:
+            item = self._data.get(k)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._data[k]
+                return None
+            self._data.move_to_end(k)
+            return item[1]
+
+    def set(self, k, value):
+        with self._lock:
+            self._data[k] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(k)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def pop(self, k):
+        with self._lock:
+            self._data.pop(k, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_l1 = _LRU(L1_SIZE, L1_TTL)
+_listener_pid = None
+
+
+def _listen_invalidations():
+    while True:
+        try:
+            ps = _redis.pubsub(ignore_subscribe_messages=True)
+            ps.subscribe(INVALIDATE_CHANNEL)
+            _l1.clear()  # pode ter perdido mensagens antes de (re)assinar
+            for msg in ps.listen():
+                _l1.pop(msg["data"].decode())
+        except Exception as exc:
+            logger.warning("listener de invalidação do L1 caiu (%s); reconectando", exc)
+            _l1.clear()
+            time.sleep(1)
+
+
+def _ensure_listener():
+    # uma thread por processo; depois de um fork o filho sobe a sua
+    global _listener_pid
+    if _listener_pid != os.getpid():
+        _listener_pid = os.getpid()
+        _l1.clear()
+        threading.Thread(target=_listen_invalidations, name="cache-l1-invalidation", daemon=True).start()
+
+
+def invalidate(ns, *parts):
+    """Remove a chave do Redis e de todos os L1."""
+    k = _key(ns, *parts)
+    _redis.delete(k)
+    _l1.pop(k)
+    _redis.publish(INVALIDATE_CHANNEL, k)
+
+# Single-flight: num miss, só um worker (o "líder", dono do lock) vai ao
+# upstream; os demais esperam o valor aparecer no cache.
+FILL_LOCK_TTL = float(os.getenv("CACHE_FILL_LOCK_TTL", "15"))  # s (> timeout do upstream)
+FILL_WAIT = float(os.getenv("CACHE_FILL_WAIT", "3"))           # s que um não-líder espera
+FILL_POLL = 0.05
+
+# libera o lock só se ele ainda for nosso
+_release_lock = _redis.register_script(
+    "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end return 0"
+)
+
 def _key(ns, *parts): return f"ct:{ns}:" + ":".join(parts)
 
+def key(ns, *parts):
+    return _key(ns, *parts)
+
+def client():
+    """Cliente Redis compartilhado, para estruturas além de JSON (hashes, zsets, locks)."""
+    return _redis
+
 def get_json(ns, *parts):
     v = _redis.get(_key(ns, *parts))
     return json.loads(v) if v else None
@@ -11,6 +124,242 @@ def get_json(ns, *parts):
 def set_json(ns, value, ttl, *parts):
     _redis.setex(_key(ns, *parts), ttl, json.dumps(value))
 
+def hget_json_many(ns, fields, *parts):
+    """
+    Lê vários campos de um hash Redis de uma vez (HMGET).
+    Retorna {campo: valor} apenas para os campos existentes.
+    """
+    fields = list(fields)
+    if not fields:
+        return {}
+    values = _redis.hmget(_key(ns, *parts), fields)
+    return {f: json.loads(v) for f, v in zip(fields, values) if v}
+
+def hset_json_many(ns, mapping, *parts):
+    if mapping:
+        _redis.hset(_key(ns, *parts), mapping={f: json.dumps(v) for f, v in mapping.items()})
+
+# Campos que marcam uma resposta servida a partir do cache: o corpo guardado
+# já é renderizado com eles, pronto para ir direto para o cliente.
+HIT_FIELDS = {"cached": True}
+
+
+class Entry:
+    """
+    Entrada SWR: corpo JSON já renderizado (versão "hit"), ETag do corpo e
+    instante (epoch) em que deixa de ser fresca. No Redis fica como
+    <cabeçalho json>\n<corpo>, então um hit não precisa de json.loads.
+    """
+    __slots__ = ("body", "etag", "soft", "_value")
+
+    def __init__(self, body, etag, soft, value=None):
+        self.body, self.etag, self.soft, self._value = body, etag, soft, value
+
+    @property
+    def fresh(self):
+        return time.time() < self.soft
+
+    @property
+    def servable(self):
+        """Ainda dentro da janela stale (serve e revalida em background)."""
+        return time.time() < self.soft + STALE_TTL
+
+    @property
+    def value(self):
+        """Payload como dict (cópia nova a cada acesso; o do líder vem sem HIT_FIELDS)."""
+        if isinstance(self._value, bytes):
+            return self._value
+        if self._value is not None:
+            return dict(self._value)
+        return json.loads(self.body)
+
+    @classmethod
+    def build(cls, value, ttl):
+        if isinstance(value, bytes):
+            body = value  # payload já serializado (ex.: série binária do /chart/)
+        else:
+            body = json.dumps({**value, **HIT_FIELDS}, separators=(",", ":"), ensure_ascii=False).encode()
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        return cls(body, etag, time.time() + ttl, value)
+
+    @property
+    def binary(self):
+        """Corpo não é JSON (ex.: série empacotada): value devolve os bytes."""
+        return isinstance(self._value, bytes)
+
+    def dumps(self):
+        meta = {"soft": self.soft, "etag": self.etag}
+        if self.binary:
+            meta["binary"] = True
+        return json.dumps(meta).encode() + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, raw):
+        head, sep, body = raw.partition(b"\n")
+        if not sep:
+            return None  # formato antigo
+        meta = json.loads(head)
+        return cls(body, meta["etag"], meta["soft"], body if meta.get("binary") else None)
+
+
+def set_entry(ns, value, ttl, *parts, last_known=False):
+    """
+    Grava uma entrada SWR: fresca por 'ttl' s, servível como stale por mais
+    STALE_TTL s e, se last_known, guardada como último valor conhecido por
+    mais DEGRADED_TTL s.
+    """
+    k = _key(ns, *parts)
+    entry = Entry.build(value, ttl)
+    _redis.setex(k, int(ttl + STALE_TTL + (DEGRADED_TTL if last_known else 0)), entry.dumps())
+    _l1.pop(k)
+    _redis.publish(INVALIDATE_CHANNEL, k)
+    return entry
+
+def get_raw_entry(ns, *parts):
+    """Entry (L1 antes do Redis) ou None se a chave não existe."""
+    _ensure_listener()
+    k = _key(ns, *parts)
+    entry = _l1.get(k)
+    if entry is None:
+        raw = _redis.get(k)
+        entry = Entry.loads(raw) if raw else None
+        if entry is None:
+            return None
+        _l1.set(k, entry)
+    return entry
+
+def get_entry(ns, *parts):
+    """Retorna (valor, fresco?) ou (None, False) se a chave não existe."""
+    entry = get_raw_entry(ns, *parts)
+    if entry is None:
+        return None, False
+    return entry.value, entry.fresh
+
+def _claim_refresh(ns, *parts):
+    return bool(_redis.set(_key("refresh", ns, *parts), 1, nx=True, ex=REFRESH_LOCK_TTL))
+
+def _schedule_refresh(refresh, ns, *parts):
+    if refresh is None or not _claim_refresh(ns, *parts):
+        return
+    try:
+        refresh()
+    except Exception as exc:
+        logger.warning("não foi possível agendar refresh de %s (%s)", _key(ns, *parts), exc)
+        _redis.delete(_key("refresh", ns, *parts))
+
+def refill(ns, ttl, fetch, *parts, last_known=False):
+    """
+    Usado pela task de refresh: busca e regrava a entrada. Em caso de erro a
+    entrada stale continua lá e o lock de refresh expira sozinho (backoff).
+    """
+    entry = set_entry(ns, fetch(), ttl, *parts, last_known=last_known)
+    _redis.delete(_key("refresh", ns, *parts))
+    return entry
+
+
+class FillTimeout(RuntimeError):
+    """Outro worker está buscando esta chave e não terminou dentro de FILL_WAIT."""
+    retry_after = 1.0
+
+
+def _metric(name):
+    try:
+        _redis.hincrby(_key("metrics", "singleflight"), name, 1)
+    except redis.RedisError:
+        pass
+
+def single_flight_stats():
+    raw = _redis.hgetall(_key("metrics", "singleflight"))
+    return {k.decode(): int(v) for k, v in raw.items()}
+
+def _try_lock(lock, token):
+    return bool(_redis.set(lock, token, nx=True, px=int(FILL_LOCK_TTL * 1000)))
+
+def _release(lock, token):
+    _release_lock(keys=[lock], args=[token])
+
+def get_or_fill(ns, ttl, fetch, *parts, refresh=None, last_known=False):
+    """
+    Lê a entrada do cache:
+    - fresca: devolve (entry, HIT);
+    - stale: devolve (entry, STALE) na hora e chama refresh() (enfileira a
+      task de refresh) se ninguém o fez recentemente;
+    - miss: só um processo chama fetch() e grava o resultado — os concorrentes
+      esperam até FILL_WAIT pelo valor (polling). Devolve (entry, MISS) para o
+      líder e (entry, HIT) para quem esperou.
+    Exceções de fetch() sobem para quem chamou, a não ser que exista um valor
+    antigo (além da janela stale, só com last_known): aí ele é devolvido como
+    (entry, DEGRADED). last_known também vale para a gravação.
+    """
+    entry = get_raw_entry(ns, *parts)
+    if entry is not None:
+        if entry.fresh:
+            return entry, HIT
+        if entry.servable:
+            _schedule_refresh(refresh, ns, *parts)
+            return entry, STALE
+    last = entry
+    lock, token = _key("lock", ns, *parts), uuid.uuid4().hex
+    deadline = time.monotonic() + FILL_WAIT
+    while True:
+        if _try_lock(lock, token):
+            _metric("leader")
+            try:
+                return set_entry(ns, fetch(), ttl, *parts, last_known=last_known), MISS
+            except Exception as exc:
+                return _degraded(last, exc, ns, *parts)
+            finally:
+                _release(lock, token)
+        time.sleep(FILL_POLL)
+        entry = get_raw_entry(ns, *parts)
+        if entry is not None and entry.servable:
+            _metric("coalesced")
+            return entry, HIT
+        if time.monotonic() >= deadline:
+            _metric("timeout")
+            return _degraded(last, FillTimeout(f"cache fill in progress for {_key(ns, *parts)}"), ns, *parts)
+
+def _degraded(last, exc, ns, *parts):
+    """Falha ao buscar: devolve o último valor conhecido, se houver; senão relança."""
+    if last is None:
+        raise exc
+    _metric("degraded")
+    logger.warning("servindo último valor conhecido de %s (%s)", _key(ns, *parts), exc)
+    return last, DEGRADED
+
+async def aget_or_fill(ns, ttl, fetch, *parts, refresh=None, last_known=False):
+    """Versão async de get_or_fill: fetch é uma coroutine function; espera com asyncio.sleep."""
+    entry = await asyncio.to_thread(get_raw_entry, ns, *parts)
+    if entry is not None:
+        if entry.fresh:
+            return entry, HIT
+        if entry.servable:
+            await asyncio.to_thread(_schedule_refresh, refresh, ns, *parts)
+            return entry, STALE
+    last = entry
+    lock, token = _key("lock", ns, *parts), uuid.uuid4().hex
+    deadline = time.monotonic() + FILL_WAIT
+    while True:
+        if await asyncio.to_thread(_try_lock, lock, token):
+            await asyncio.to_thread(_metric, "leader")
+            try:
+                value = await fetch()
+                entry = await asyncio.to_thread(functools.partial(set_entry, last_known=last_known), ns, value, ttl, *parts)
+                return entry, MISS
+            except Exception as exc:
+                return await asyncio.to_thread(_degraded, last, exc, ns, *parts)
+            finally:
+                await asyncio.to_thread(_release, lock, token)
+        await asyncio.sleep(FILL_POLL)
+        entry = await asyncio.to_thread(get_raw_entry, ns, *parts)
+        if entry is not None and entry.servable:
+            await asyncio.to_thread(_metric, "coalesced")
+            return entry, HIT
+        if time.monotonic() >= deadline:
+            await asyncio.to_thread(_metric, "timeout")
+            exc = FillTimeout(f"cache fill in progress for {_key(ns, *parts)}")
+            return await asyncio.to_thread(_degraded, last, exc, ns, *parts)
+
 def now_iso():
     import datetime
     return datetime.datetime.utcnow().isoformat() + "Z"
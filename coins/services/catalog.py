@@ -0,0 +1,66 @@
+import logging
+from typing import Any, Dict
+
+from coins.models import CoinMetadata
+from . import coingecko, prices, universe
+
+logger = logging.getLogger(__name__)
+
+# Catálogo local de metadados (coins.CoinMetadata): nome/símbolo de todas as
+# moedas vêm do /coins/list e as imagens do universo de mercado já aquecido no
+# Redis (top COIN_UNIVERSE_SIZE). Os create dos serializers leem daqui: um
+# SELECT por pk, sem chamada à CoinGecko no caminho do POST.
+UPSERT_BATCH = 2000
+SYMBOL_MAX = 20  # coin_symbol dos modelos do portfolio
+
+
+def refresh() -> Dict[str, int]:
+    """Recarrega o catálogo em lote (upsert). Retorna contagens."""
+    listed = coingecko.coins_list()
+    images = {c["id"]: c["image"] for c in universe.all_rows() if c.get("id") and c.get("image")}
+    with_image, without_image = [], []
+    for c in listed:
+        cid = c.get("id")
+        if not cid:
+            continue
+        row = CoinMetadata(coin_id=cid, symbol=c.get("symbol") or "", name=c.get("name") or cid,
+                           image=images.get(cid, ""))
+        (with_image if row.image else without_image).append(row)
+
+    # quem não está no universo mantém a imagem que já tinha (não sobrescreve com "")
+    CoinMetadata.objects.bulk_create(
+        with_image, batch_size=UPSERT_BATCH, update_conflicts=True,
+        unique_fields=["coin_id"], update_fields=["symbol", "name", "image", "updated_at"],
+    )
+    CoinMetadata.objects.bulk_create(
+        without_image, batch_size=UPSERT_BATCH, update_conflicts=True,
+        unique_fields=["coin_id"], update_fields=["symbol", "name", "updated_at"],
+    )
+    stats = {"coins": len(with_image) + len(without_image), "with_image": len(with_image)}
+    logger.info("refresh_coin_catalog: %s", stats)
+    return stats
+
+
+def coin_info(coin_id: str) -> Dict[str, Any]:
+    """
+    Nome/símbolo/imagem de uma moeda para enriquecer favoritos, holdings e alertas.
+    Vem do catálogo; só uma moeda que ele ainda não conhece vai ao /coins/{id}
+    (que também valida o coin_id) e o resultado entra no catálogo e no snapshot.
+    """
+    row = CoinMetadata.objects.filter(coin_id=coin_id).values("name", "symbol", "image").first()
+    if row is not None:
+        return {**row, "symbol": row["symbol"][:SYMBOL_MAX]}
+
+    d = coingecko.coin_detail(coin_id)
+    image = (d.get("image") or {}).get("small") or (d.get("image") or {}).get("thumb") or ""
+    info = {"name": d.get("name") or coin_id, "symbol": (d.get("symbol") or "")[:SYMBOL_MAX], "image": image}
+    CoinMetadata.objects.update_or_create(coin_id=coin_id, defaults=info)
+    md = d.get("market_data") or {}
+    price = (md.get("current_price") or {}).get("usd")
+    if price is not None:
+        prices.write_snapshot({coin_id: {
+            "price": price,
+            "change_24h": md.get("price_change_percentage_24h"),
+            **info,
+        }})
+    return info
@@ -1,10 +1,15 @@
 import os
 import time
 import logging
-from typing import Any, Dict, List, Optional, Tuple
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
 from urllib.parse import urljoin
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from . import breaker, ratelimit
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +22,18 @@ USE_QUERY_KEY = os.getenv("COINGECKO_KEY_IN_QUERY", "0") == "1"  # por seguranç
 DEFAULT_TIMEOUT = float(os.getenv("COINGECKO_TIMEOUT", "10"))
 MAX_RETRIES = int(os.getenv("COINGECKO_MAX_RETRIES", "3"))
 BACKOFF_BASE = float(os.getenv("COINGECKO_BACKOFF_BASE", "0.7"))  # segundos
+RETRY_STATUSES = (502, 503, 504)
+
+# Pool HTTP persistente (keep-alive) por processo
+POOL_SIZE = int(os.getenv("COINGECKO_POOL_SIZE", "10"))
+
+# Quantidade máxima de ids por chamada em /simple/price
+SIMPLE_PRICE_BATCH = int(os.getenv("COINGECKO_SIMPLE_PRICE_BATCH", "250"))
+
+# Fan-out paralelo (lotes do simple_price): threads por processo e prazo total de cada chamada.
+# Mais threads que POOL_SIZE só esperariam conexão livre no pool HTTP.
+FANOUT_WORKERS = int(os.getenv("COINGECKO_FANOUT_WORKERS", str(POOL_SIZE)))
+FANOUT_DEADLINE = float(os.getenv("COINGECKO_FANOUT_DEADLINE", "8"))  # segundos
 
 
 def _build_headers() -> Dict[str, str]:
@@ -32,6 +49,108 @@ def _build_headers() -> Dict[str, str]:
     return headers
 
 
+class UpstreamUnavailable(RuntimeError):
+    """CoinGecko não pode ser consultada agora; quem chama deve servir dado em cache."""
+
+
+class RateLimitExceeded(UpstreamUnavailable):
+    """Sem orçamento no token bucket global (ou 429 do upstream)."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"CoinGecko rate limit budget exhausted (retry in {retry_after:.1f}s)")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    """Prazo do fan-out acabou: a tarefa atrasada não faz mais tentativas."""
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """Circuit breaker aberto: a CoinGecko vinha falhando e não é chamada agora."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"CoinGecko circuit open (retry in {retry_after:.1f}s)")
+        self.retry_after = retry_after
+
+
+def _take_token(prio: str) -> None:
+    allowed, wait = ratelimit.acquire(prio)
+    if not allowed:
+        raise RateLimitExceeded(wait)
+
+
+# Prazo (time.monotonic) do fan-out que disparou esta chamada. O pool não
+# consegue interromper uma tarefa já rodando, então ela mesma confere o prazo
+# antes de cada tentativa e desiste em vez de gastar mais tokens.
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("coingecko_deadline", default=None)
+
+
+def _before_attempt(prio: str) -> None:
+    """Circuit breaker antes do rate limiter: com o circuito aberto nem gasta token."""
+    expires = _deadline.get()
+    if expires is not None and time.monotonic() >= expires:
+        raise DeadlineExceeded("CoinGecko fan-out deadline exceeded")
+    allowed, wait = breaker.allow()
+    if not allowed:
+        raise CircuitOpen(wait)
+    _take_token(prio)
+
+
+def _record_outcome(status: Optional[int]) -> None:
+    """Erro de rede (status None) ou 5xx conta como falha no breaker; o resto fecha."""
+    if status is None or status >= 500:
+        breaker.record_failure()
+    elif status != 429:
+        breaker.record_success()
+
+
+def _on_rate_limited(resp_headers) -> None:
+    """429 do upstream: esvazia o bucket global e avisa quem chamou, sem dormir."""
+    retry_after = _retry_delay(1, resp_headers.get("Retry-After"))
+    ratelimit.drain(retry_after)
+    raise RateLimitExceeded(retry_after)
+
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+
+
+def _get_session() -> requests.Session:
+    """
+    Session única por processo, com pool de conexões (keep-alive) e headers
+    montados uma vez só. Guarda o PID de quem criou: depois de um fork
+    (Celery prefork, gunicorn) o filho cria a própria Session em vez de
+    herdar sockets do pai.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0)
+        s.mount("https://", adapter)
+        s.mount("http://", adapter)
+        s.headers.update(_build_headers())
+        _session, _session_pid = s, pid
+    return _session
+
+
+def pool_stats() -> Dict[str, int]:
+    """
+    Contadores do pool HTTP deste processo: requests feitas, conexões novas
+    (miss) e requests que reaproveitaram uma conexão aberta (hit).
+    """
+    stats = {"requests": 0, "connections": 0, "reused": 0}
+    if _session is None or _session_pid != os.getpid():
+        return stats
+    pools = _session.get_adapter(BASE).poolmanager.pools
+    for key in pools.keys():
+        pool = pools[key]
+        stats["requests"] += pool.num_requests
+        stats["connections"] += pool.num_connections
+    stats["reused"] = stats["requests"] - stats["connections"]
+    return stats
+
+
 def _inject_key_in_params(params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     """
     (Opcional, não recomendado) Permite mandar a chave via query string
@@ -50,31 +169,40 @@ def _request(
     timeout: Optional[float] = None,
 ) -> Tuple[int, Any]:
     """
-    Faz a request com retry/backoff em 429/502/503/504 e erros de rede.
+    Faz a request com retry/backoff em 502/503/504 e erros de rede.
+    Cada tentativa passa pelo circuit breaker (aberto -> CircuitOpen na hora,
+    inclusive no meio dos retries) e consome um token do rate limiter global;
+    sem orçamento (ou num 429) levanta RateLimitExceeded, em vez de dormir.
     Retorna (status_code, json|text).
     """
     url = urljoin(BASE + "/", path.lstrip("/"))
-    headers = _build_headers()
+    session = _get_session()
     params = _inject_key_in_params(params)
     timeout = timeout or DEFAULT_TIMEOUT
+    prio = ratelimit.current_priority()
 
     attempt = 0
     while True:
         attempt += 1
+        _before_attempt(prio)
         try:
-            resp = requests.request(method, url, headers=headers, params=params, timeout=timeout)
+            resp = session.request(method, url, params=params, timeout=timeout)
         except requests.RequestException as exc:
+            _record_outcome(None)
             if attempt <= MAX_RETRIES:
-                sleep_for = BACKOFF_BASE * (2 ** (attempt - 1))
+                sleep_for = _retry_delay(attempt)
                 logger.warning("CoinGecko network error (%s). retry %d/%d in %.2fs", exc, attempt, MAX_RETRIES, sleep_for)
                 time.sleep(sleep_for)
                 continue
             raise
 
-        if resp.status_code in (429, 502, 503, 504):
+        _record_outcome(resp.status_code)
+        if resp.status_code == 429:
+            _on_rate_limited(resp.headers)
+
+        if resp.status_code in RETRY_STATUSES:
             if attempt <= MAX_RETRIES:
-                retry_after = resp.headers.get("Retry-After")
-                sleep_for = float(retry_after) if retry_after and retry_after.isdigit() else BACKOFF_BASE * (2 ** (attempt - 1))
+                sleep_for = _retry_delay(attempt, resp.headers.get("Retry-After"))
                 logger.warning("CoinGecko %s for %s. retry %d/%d in %.2fs", resp.status_code, url, attempt, MAX_RETRIES, sleep_for)
                 time.sleep(sleep_for)
                 continue
@@ -86,8 +214,101 @@ def _request(
         return resp.status_code, data
 
 
+# --------- Parâmetros (compartilhados com o cliente async) ---------
+
+DETAIL_PARAMS = {
+    "localization": "false",
+    "tickers": "false",
+    "market_data": "true",
+    "community_data": "false",
+    "developer_data": "false",
+    "sparkline": "false",
+}
+
+
+def _markets_params(page: int, per_page: int) -> Dict[str, Any]:
+    return {
+        "vs_currency": "usd",
+        "order": "market_cap_desc",
+        "per_page": min(max(per_page, 1), 250),
+        "page": max(page, 1),
+        "sparkline": "false",
+        "price_change_percentage": "24h",
+        "locale": "en",
+    }
+
+
+def _simple_price_params(ids: List[str]) -> Dict[str, Any]:
+    return {"ids": ",".join(ids), "vs_currencies": "usd", "include_24hr_change": "true"}
+
+
+def _retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return BACKOFF_BASE * (2 ** (attempt - 1))
+
+
 # --------- Helpers públicos usados pelos views/serviços ---------
 
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # mesmo cuidado da Session: threads não sobrevivem a um fork
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="coingecko")
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def _fan_out(fn: Callable[[Any], Any], keys: Iterable[Hashable], deadline: Optional[float] = None) -> Dict[Any, Any]:
+    """
+    Roda fn(key) para cada key no pool, até 'deadline' segundos no total, e
+    devolve {key: resultado} só do que terminou a tempo e sem erro. Se nada
+    deu certo, relança o primeiro erro (ex.: RateLimitExceeded vira 503), ou
+    DeadlineExceeded se nada respondeu no prazo.
+    Cada tarefa roda numa cópia do contexto de quem chamou, então a
+    prioridade do rate limiter (ratelimit.priority) vale dentro do pool.
+    Tarefas que passam do prazo são abandonadas e não fazem novas tentativas
+    (ver _deadline); as que nem começaram são canceladas.
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+    timeout = FANOUT_DEADLINE if deadline is None else deadline
+    expires = time.monotonic() + timeout
+
+    def run(key):
+        _deadline.set(expires)
+        return fn(key)
+
+    pool = _get_executor()
+    futures = {pool.submit(contextvars.copy_context().run, run, k): k for k in keys}
+    done, pending = wait(futures, timeout=timeout)
+    for f in pending:
+        f.cancel()
+    out: Dict[Any, Any] = {}
+    errors: List[BaseException] = []
+    for f in done:
+        exc = f.exception()
+        if exc is None:
+            out[futures[f]] = f.result()
+        else:
+            errors.append(exc)
+    if pending or errors:
+        logger.warning(
+            "fan-out CoinGecko parcial: %d ok, %d com erro, %d sem resposta no prazo",
+            len(out), len(errors), len(pending),
+        )
+    if not out and errors:
+        raise errors[0]
+    if not out and pending:
+        raise DeadlineExceeded(f"CoinGecko fan-out: nothing answered within {timeout:.1f}s")
+    return out
+
+
 def ping() -> Dict[str, Any]:
     status, data = _request("GET", "/ping")
     if status != 200:
@@ -100,35 +321,48 @@ def list_markets(page: int = 1, per_page: int = 20, search: Optional[str] = None
     'search' não é suportado nativamente aqui; se quiser buscar por texto,
     você pode usar /search para obter 'ids' e filtrar (não implementado aqui para manter compatível).
     """
-    params: Dict[str, Any] = {
-        "vs_currency": "usd",
-        "order": "market_cap_desc",
-        "per_page": min(max(per_page, 1), 250),
-        "page": max(page, 1),
-        "sparkline": "false",
-        "price_change_percentage": "24h",
-        "locale": "en",
-    }
     # Mantém compatível com sua assinatura atual:
     # se precisar realmente aplicar 'search' na CG, posso te adicionar um search_ids() depois.
-    status, data = _request("GET", "/coins/markets", params=params)
+    status, data = _request("GET", "/coins/markets", params=_markets_params(page, per_page))
     if status != 200 or not isinstance(data, list):
         raise RuntimeError(f"CoinGecko markets failed: {status} - {data}")
     return data
 
+def coins_list() -> List[Dict[str, Any]]:
+    """
+    /coins/list — id, símbolo e nome de todas as moedas (sem preço nem imagem).
+    Payload grande (~15k moedas): usado só pelo refresh do catálogo local.
+    """
+    status, data = _request("GET", "/coins/list", timeout=max(DEFAULT_TIMEOUT, 30))
+    if status != 200 or not isinstance(data, list):
+        raise RuntimeError(f"CoinGecko coins list failed: {status} - {data}")
+    return data
+
+def simple_price(coin_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    /simple/price — preço em USD (e variação 24h) de várias moedas de uma vez.
+    Os ids são enviados em lotes de SIMPLE_PRICE_BATCH (em paralelo) para não
+    estourar a URL. Ids desconhecidos simplesmente não aparecem no retorno.
+    """
+    ids = sorted({c for c in coin_ids if c})
+    batches = [tuple(ids[i:i + SIMPLE_PRICE_BATCH]) for i in range(0, len(ids), SIMPLE_PRICE_BATCH)]
+    out: Dict[str, Dict[str, Any]] = {}
+    # lotes em paralelo; um lote que falhar ou estourar o prazo fica de fora (resultado parcial)
+    for data in _fan_out(_simple_price_batch, batches).values():
+        out.update(data)
+    return out
+
+def _simple_price_batch(ids: Tuple[str, ...]) -> Dict[str, Dict[str, Any]]:
+    status, data = _request("GET", "/simple/price", params=_simple_price_params(list(ids)))
+    if status != 200 or not isinstance(data, dict):
+        raise RuntimeError(f"CoinGecko simple price failed: {status} - {data}")
+    return data
+
 def coin_detail(coin_id: str) -> Dict[str, Any]:
     """
     /coins/{id} — detalhes com market_data (usado no PortfolioSummary e afins).
     """
-    params = {
-        "localization": "false",
-        "tickers": "false",
-        "market_data": "true",
-        "community_data": "false",
-        "developer_data": "false",
-        "sparkline": "false",
-    }
-    status, data = _request("GET", f"/coins/{coin_id}", params=params)
+    status, data = _request("GET", f"/coins/{coin_id}", params=DETAIL_PARAMS)
     if status != 200 or not isinstance(data, dict):
         raise RuntimeError(f"CoinGecko coin detail failed: {status} - {data}")
     return data
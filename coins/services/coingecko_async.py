@@ -0,0 +1,143 @@
+import os
+import asyncio
+import contextlib
+import logging
+import weakref
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import httpx
+
+from . import ratelimit
+from .coingecko import (
+    BASE, DEFAULT_TIMEOUT, MAX_RETRIES, RETRY_STATUSES, SIMPLE_PRICE_BATCH, DETAIL_PARAMS,
+    _build_headers, _inject_key_in_params, _markets_params, _simple_price_params, _retry_delay,
+    _before_attempt, _record_outcome, _on_rate_limited,
+)
+
+logger = logging.getLogger(__name__)
+
+# Máximo de requests simultâneas à CoinGecko por event loop (processo ASGI)
+MAX_CONCURRENCY = int(os.getenv("COINGECKO_ASYNC_CONCURRENCY", "100"))
+
+# Servindo ASGI (core/asgi.py marca SERVER_MODE=asgi), o event loop dura o
+# processo inteiro: um AsyncClient + Semaphore por loop dá pool de conexões
+# compartilhado por todas as requests do worker. Fora dele (asyncio.run,
+# async_to_sync em scripts/testes) cada loop é de vida curta e nunca avisa que
+# acabou, então cada chamada abre o próprio client e o fecha ao terminar.
+SHARED_CLIENT = os.getenv("SERVER_MODE") == "asgi"
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        headers=_build_headers(),
+        timeout=DEFAULT_TIMEOUT,
+        limits=httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY),
+    )
+
+
+@contextlib.asynccontextmanager
+async def _client() -> AsyncIterator[Tuple[httpx.AsyncClient, asyncio.Semaphore]]:
+    if SHARED_CLIENT:
+        loop = asyncio.get_running_loop()
+        pair = _clients.get(loop)
+        if pair is None:
+            pair = _clients[loop] = (_new_client(), asyncio.Semaphore(MAX_CONCURRENCY))
+        yield pair
+        return
+    async with _new_client() as client:
+        yield client, asyncio.Semaphore(MAX_CONCURRENCY)
+
+
+async def _request(
+    method: str,
+    path: str,
+    params: Optional[Dict[str, Any]] = None,
+    timeout: Optional[float] = None,
+) -> Tuple[int, Any]:
+    """
+    Mesma semântica do coingecko._request (retry/backoff em 502/503/504 e
+    erros de rede, circuit breaker e rate limiter globais), mas com asyncio.sleep e concorrência limitada.
+    """
+    url = urljoin(BASE + "/", path.lstrip("/"))
+    params = _inject_key_in_params(params)
+    timeout = timeout or DEFAULT_TIMEOUT
+    prio = ratelimit.current_priority()
+
+    async with _client() as (client, sem):
+        attempt = 0
+        while True:
+            attempt += 1
+            await asyncio.to_thread(_before_attempt, prio)
+            try:
+                async with sem:
+                    resp = await client.request(method, url, params=params, timeout=timeout)
+            except httpx.HTTPError as exc:
+                await asyncio.to_thread(_record_outcome, None)
+                if attempt <= MAX_RETRIES:
+                    sleep_for = _retry_delay(attempt)
+                    logger.warning("CoinGecko network error (%s). retry %d/%d in %.2fs", exc, attempt, MAX_RETRIES, sleep_for)
+                    await asyncio.sleep(sleep_for)
+                    continue
+                raise
+
+            await asyncio.to_thread(_record_outcome, resp.status_code)
+            if resp.status_code == 429:
+                _on_rate_limited(resp.headers)
+
+            if resp.status_code in RETRY_STATUSES:
+                if attempt <= MAX_RETRIES:
+                    sleep_for = _retry_delay(attempt, resp.headers.get("Retry-After"))
+                    logger.warning("CoinGecko %s for %s. retry %d/%d in %.2fs", resp.status_code, url, attempt, MAX_RETRIES, sleep_for)
+                    await asyncio.sleep(sleep_for)
+                    continue
+
+            try:
+                data = resp.json()
+            except ValueError:
+                data = resp.text
+            return resp.status_code, data
+
+
+# --------- Mesma superfície pública do coingecko.py ---------
+
+async def ping() -> Dict[str, Any]:
+    status, data = await _request("GET", "/ping")
+    if status != 200:
+        raise RuntimeError(f"CoinGecko ping failed: {status} - {data}")
+    return data
+
+async def list_markets(page: int = 1, per_page: int = 20, search: Optional[str] = None) -> List[Dict[str, Any]]:
+    status, data = await _request("GET", "/coins/markets", params=_markets_params(page, per_page))
+    if status != 200 or not isinstance(data, list):
+        raise RuntimeError(f"CoinGecko markets failed: {status} - {data}")
+    return data
+
+async def simple_price(coin_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    ids = sorted({c for c in coin_ids if c})
+    batches = [ids[i:i + SIMPLE_PRICE_BATCH] for i in range(0, len(ids), SIMPLE_PRICE_BATCH)]
+    out: Dict[str, Dict[str, Any]] = {}
+    for status, data in await asyncio.gather(
+        *(_request("GET", "/simple/price", params=_simple_price_params(b)) for b in batches)
+    ):
+        if status != 200 or not isinstance(data, dict):
+            raise RuntimeError(f"CoinGecko simple price failed: {status} - {data}")
+        out.update(data)
+    return out
+
+async def coin_detail(coin_id: str) -> Dict[str, Any]:
+    status, data = await _request("GET", f"/coins/{coin_id}", params=DETAIL_PARAMS)
+    if status != 200 or not isinstance(data, dict):
+        raise RuntimeError(f"CoinGecko coin detail failed: {status} - {data}")
+    return data
+
+async def coin_chart(coin_id: str, days: int | str = 7) -> Dict[str, Any]:
+    params = {"vs_currency": "usd", "days": str(days)}
+    status, data = await _request("GET", f"/coins/{coin_id}/market_chart", params=params)
+    if status != 200 or not isinstance(data, dict):
+        raise RuntimeError(f"CoinGecko market chart failed: {status} - {data}")
+    return data
@@ -0,0 +1,42 @@
+import numpy as np
+
+# Largest-Triangle-Three-Buckets (Steinarsson, 2013): reduz uma série a 'n'
+# pontos preservando a forma visual (picos e vales), bem melhor que pegar
+# 1 a cada k. Primeiro e último pontos são sempre mantidos.
+
+
+def lttb(points, n):
+    """
+    points: sequência de [timestamp_ms, preço] ordenada por timestamp.
+    Devolve no máximo n pontos (a própria lista se já couber).
+    """
+    size = len(points)
+    if n >= size or n < 3:
+        return points
+    data = np.asarray(points, dtype=np.float64)
+    x, y = data[:, 0], data[:, 1]
+
+    # n-2 buckets para os pontos do meio; limites e médias de todos de uma vez
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[1:-1], edges[:-1] - 1) / counts
+    avg_y = np.add.reduceat(y[1:-1], edges[:-1] - 1) / counts
+    # o "próximo" do último bucket é o último ponto
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # área do triângulo (ponto escolhido antes, candidato, média do próximo bucket)
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (next_y[i] - y[a])
+        )
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+
+    out = data[selected]
+    return [[int(t), float(p)] for t, p in out]
@@ -0,0 +1,53 @@
+import struct
+
+import numpy as np
+
+# Formato binário das séries do /chart/ (?format=bin ou Accept: MEDIA_TYPE),
+# tudo little-endian:
+#   cabeçalho  magic (4 bytes) | uint32 n | int64 primeiro timestamp (ms)
+#   "CTS1": n int32 deltas de timestamp (ms; o primeiro é 0)
+#   "CTS2": n int64 timestamps absolutos (ms) — quando algum delta não cabe
+#           em int32 (~24,8 dias; ex.: days=max com poucos pontos)
+#   n float64  preços
+# Os timestamps vão em delta sempre que possível (4 bytes); os preços vão crus
+# porque delta de float não é reversível sem perda. O mesmo blob é o que fica no Redis.
+MEDIA_TYPE = "application/vnd.cryptotracker.series"
+FORMAT = "bin"
+MAGIC = b"CTS1"
+MAGIC_ABSOLUTE = b"CTS2"
+_HEADER = struct.Struct("<4sIq")
+_I32 = np.iinfo(np.int32)
+
+
+def pack(prices):
+    """[[timestamp_ms, preço], ...] -> bytes."""
+    data = np.asarray(prices, dtype=np.float64).reshape(-1, 2)
+    ts = data[:, 0].astype(np.int64)
+    first = int(ts[0]) if len(ts) else 0
+    deltas = np.diff(ts, prepend=first)
+    if len(deltas) and (deltas.max() > _I32.max or deltas.min() < _I32.min):
+        head, stamps = MAGIC_ABSOLUTE, ts.astype("<i8")
+    else:
+        head, stamps = MAGIC, deltas.astype("<i4")
+    return _HEADER.pack(head, len(ts), first) + stamps.tobytes() + data[:, 1].astype("<f8").tobytes()
+
+
+def unpack(raw):
+    """bytes -> (timestamps int64 ms, preços float64) como arrays NumPy."""
+    magic, n, first = _HEADER.unpack_from(raw)
+    offset = _HEADER.size
+    if magic == MAGIC:
+        deltas = np.frombuffer(raw, dtype="<i4", count=n, offset=offset)
+        ts = first + np.cumsum(deltas, dtype=np.int64)
+        offset += 4 * n
+    elif magic == MAGIC_ABSOLUTE:
+        ts = np.frombuffer(raw, dtype="<i8", count=n, offset=offset).astype(np.int64)
+        offset += 8 * n
+    else:
+        raise ValueError("not a packed chart series")
+    return ts, np.frombuffer(raw, dtype="<f8", count=n, offset=offset)
+
+
+def to_pairs(raw):
+    ts, prices = unpack(raw)
+    return [[int(t), float(p)] for t, p in zip(ts, prices)]
@@ -0,0 +1,155 @@
+from urllib.parse import urlencode
+
+from . import coingecko, cache, universe, series, downsample, packed, search as search_index
+
+# Montagem dos payloads servidos (e cacheados) pelos endpoints de moedas.
+# Usado pelas views e pelas tasks de refresh em background.
+
+
+def _build_page_url(base, page, per_page, search):
+    q = {"page": page, "per_page": per_page}
+    if search:
+        q["search"] = search
+    return f"{base}?{urlencode(q)}"
+
+
+def detail_payload(d):
+    """Mapeia o /coins/{id} da CoinGecko para o payload plano do CoinDetailView."""
+    md = d.get("market_data") or {}
+    return {
+        "id": d.get("id"),
+        "symbol": d.get("symbol"),
+        "name": d.get("name"),
+        "description": (d.get("description") or {}).get("en", ""),
+        "image": (d.get("image") or {}).get("large")
+                 or (d.get("image") or {}).get("small")
+                 or (d.get("image") or {}).get("thumb"),
+        "current_price": (md.get("current_price") or {}).get("usd"),
+        "market_cap": (md.get("market_cap") or {}).get("usd"),
+        "market_cap_rank": md.get("market_cap_rank") or d.get("market_cap_rank"),
+        "total_volume": (md.get("total_volume") or {}).get("usd"),
+        "high_24h": (md.get("high_24h") or {}).get("usd"),
+        "low_24h": (md.get("low_24h") or {}).get("usd"),
+        # price_change_24h: valor absoluto em USD (usamos em_currency se existir)
+        "price_change_24h": (md.get("price_change_24h_in_currency") or {}).get("usd", md.get("price_change_24h")),
+        "price_change_percentage_24h": md.get("price_change_percentage_24h"),
+        "circulating_supply": md.get("circulating_supply"),
+        "total_supply": md.get("total_supply"),
+        "max_supply": md.get("max_supply"),
+        "ath": (md.get("ath") or {}).get("usd"),
+        "ath_date": (md.get("ath_date") or {}).get("usd"),
+        "links": {
+            "homepage": ((d.get("links") or {}).get("homepage") or [""])[0],
+            "blockchain_site": ((d.get("links") or {}).get("blockchain_site") or [""])[0],
+            "official_forum": ((d.get("links") or {}).get("official_forum_url") or [None])[0],
+        },
+        "cached": False,
+        "cached_at": cache.now_iso(),
+    }
+
+
+def market_row(c):
+    return {
+        "id": c.get("id"),
+        "symbol": c.get("symbol"),
+        "name": c.get("name"),
+        "image": c.get("image"),
+        "current_price": c.get("current_price"),
+        "price_change_24h": c.get("price_change_24h"),
+        "price_change_percentage_24h": c.get("price_change_percentage_24h"),
+        "market_cap": c.get("market_cap"),
+        "market_cap_rank": c.get("market_cap_rank"),
+        "total_volume": c.get("total_volume"),
+        "high_24h": c.get("high_24h"),
+        "low_24h": c.get("low_24h"),
+    }
+
+
+def list_payload(data, page, per_page, search, base):
+    # CoinGecko não devolve o total. Mantemos um valor simbólico (ou pode ser None).
+    return {
+        "count": 100,
+        "next": None if len(data) < per_page else _build_page_url(base, page + 1, per_page, search),
+        "previous": None if page == 1 else _build_page_url(base, page - 1, per_page, search),
+        "results": [market_row(c) for c in data],
+        "cached": False,
+        "cached_at": cache.now_iso(),
+    }
+
+
+def chart_payload(prices, points=0):
+    # points > 0: série reduzida por LTTB antes de ir para o cache
+    return {
+        "prices": downsample.lttb(prices, points) if points else prices,
+        "cached": False,
+        "cached_at": cache.now_iso(),
+    }
+
+
+# --------- fetchers: buscam na CoinGecko e devolvem o payload pronto ---------
+
+def universe_list_payload(page, per_page, base, meta):
+    """Página montada a partir do universo de mercado já aquecido no Redis."""
+    start = (page - 1) * per_page
+    count = meta["count"]
+    return {
+        "count": count,
+        "next": None if start + per_page >= count else _build_page_url(base, page + 1, per_page, ""),
+        "previous": None if page == 1 else _build_page_url(base, page - 1, per_page, ""),
+        "results": universe.rows(start, start + per_page),
+        "cached": True,
+        "cached_at": meta["cached_at"],
+    }
+
+
+def search_list_payload(page, per_page, search, base):
+    """
+    Busca local (índice de prefixos sobre o universo), sem cache nem upstream.
+    None se o universo ainda não foi aquecido.
+    """
+    idx = search_index.get_index()
+    meta = universe.meta()
+    if idx is None or not meta:
+        return None
+    matches = idx.search(search)
+    start = (page - 1) * per_page
+    return {
+        "count": len(matches),
+        "next": None if start + per_page >= len(matches) else _build_page_url(base, page + 1, per_page, search),
+        "previous": None if page == 1 else _build_page_url(base, page - 1, per_page, search),
+        "results": matches[start:start + per_page],
+        "cached": True,
+        "cached_at": meta["cached_at"],
+    }
+
+
+def fetch_list(page, per_page, search, base):
+    # páginas cobertas pelo universo aquecido não vão à CoinGecko
+    meta = universe.meta()
+    if meta and not search and page * per_page <= meta["count"]:
+        return universe_list_payload(page, per_page, base, meta)
+    # nota: o 'search' não é aplicado nativamente em /markets
+    data = coingecko.list_markets(page=page, per_page=per_page, search=search)
+    return list_payload(data, page, per_page, search, base)
+
+
+def fetch_detail(coin_id):
+    return detail_payload(coingecko.coin_detail(coin_id))
+
+
+def fetch_chart(coin_id, days, points=0):
+    # recorte da série local; o upstream só é chamado para o trecho que falta
+    return chart_payload(series.get_range(coin_id, days), points)
+
+
+def fetch_chart_packed(coin_id, days, points=0):
+    # mesma série, já no formato binário: é esse blob que vai para o Redis
+    return packed.pack(fetch_chart(coin_id, days, points)["prices"])
+
+
+FETCHERS = {
+    "coins:list": fetch_list,
+    "coins:detail": fetch_detail,
+    "coins:chart": fetch_chart,
+    "coins:chart:bin": fetch_chart_packed,
+}
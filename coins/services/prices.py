@@ -0,0 +1,169 @@
+import os
+import time
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+from asgiref.sync import sync_to_async
+
+from . import coingecko, coingecko_async, cache
+
+logger = logging.getLogger(__name__)
+
+# Snapshot de preços: hash Redis coin_id -> {price, change_24h, ts[, name, symbol, image]}
+# mantido pelo update_coin_prices_cache. Entradas mais velhas que
+# PRICE_SNAPSHOT_MAX_AGE são tratadas como miss e rebuscadas na CoinGecko.
+SNAPSHOT_NS = "prices"
+SNAPSHOT_MAX_AGE = int(os.getenv("PRICE_SNAPSHOT_MAX_AGE", "300"))  # segundos
+
+
+def read_snapshot(coin_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    return cache.hget_json_many(SNAPSHOT_NS, coin_ids, "snapshot")
+
+
+def write_snapshot(entries: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Grava/atualiza entradas do snapshot. Cada entrada precisa de 'price'
+    (e opcionalmente change_24h/name/symbol/image); o 'ts' é preenchido aqui.
+    """
+    ts = time.time()
+    cache.hset_json_many(SNAPSHOT_NS, {cid: {**e, "ts": ts} for cid, e in entries.items()}, "snapshot")
+
+
+def snapshot_from_markets(markets: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Alimenta o snapshot a partir do payload de /coins/markets.
+    Devolve {coin_id: {price, change_24h}} só das moedas cujo preço mudou.
+    """
+    entries = {
+        c["id"]: {
+            "price": c.get("current_price"),
+            "change_24h": c.get("price_change_percentage_24h"),
+            "name": c.get("name"),
+            "symbol": c.get("symbol"),
+            "image": c.get("image"),
+        }
+        for c in markets if c.get("id")
+    }
+    previous = read_snapshot(entries)
+    write_snapshot(entries)
+    return {
+        cid: {"price": e["price"], "change_24h": e["change_24h"]}
+        for cid, e in entries.items()
+        if e["price"] is not None and (previous.get(cid) or {}).get("price") != e["price"]
+    }
+
+
+class PriceMap(dict):
+    """
+    {coin_id: preço | None}. 'stale' guarda as moedas cujo preço veio do
+    snapshot vencido (ou ficou None, no modo partial) porque a CoinGecko não
+    respondeu (quem exibe deve marcar a resposta como não fresca). update() junta os 'stale' dos dois lados.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stale = set()
+
+    def update(self, other=(), **kwargs):
+        super().update(other, **kwargs)
+        self.stale |= getattr(other, "stale", set())
+
+
+def _from_snapshot(ids, max_age):
+    """Separa o que o snapshot já resolve (fresco) do que precisa ir à CoinGecko."""
+    max_age = SNAPSHOT_MAX_AGE if max_age is None else max_age
+    snap = read_snapshot(ids)
+    now = time.time()
+    out = PriceMap()
+    misses = []
+    for cid in ids:
+        e = snap.get(cid)
+        if e and e.get("price") is not None and now - float(e.get("ts", 0)) <= max_age:
+            out[cid] = e["price"]
+        else:
+            misses.append(cid)
+    return out, misses, snap
+
+
+def _apply_stale(out, misses, snap) -> bool:
+    stale = {cid: snap[cid]["price"] for cid in misses if (snap.get(cid) or {}).get("price") is not None}
+    if not stale:
+        return False
+    logger.warning("CoinGecko indisponível; usando snapshot vencido para %d moeda(s)", len(stale))
+    out.update(stale)
+    out.stale.update(stale)
+    return True
+
+
+def _apply_fetched(out, misses, snap, data) -> None:
+    fresh = {}
+    for cid in misses:
+        row = data.get(cid)
+        if row is None and (snap.get(cid) or {}).get("price") is not None:
+            # lote sem resposta no prazo (resultado parcial): fica o preço vencido
+            out[cid] = snap[cid]["price"]
+            out.stale.add(cid)
+            continue
+        row = row or {}
+        out[cid] = row.get("usd")
+        if row.get("usd") is not None:
+            fresh[cid] = {**(snap.get(cid) or {}), "price": row["usd"], "change_24h": row.get("usd_24h_change")}
+    write_snapshot(fresh)
+
+
+def _on_upstream_error(exc, out, misses, snap, partial) -> None:
+    if _apply_stale(out, misses, snap):
+        return
+    if not partial:
+        raise exc
+    logger.warning("CoinGecko indisponível (%s); %d moeda(s) sem preço", exc, len(misses))
+    out.update(dict.fromkeys(misses))
+    out.stale.update(misses)  # sem preço atual: quem exibe marca como não fresco
+
+
+def resolve_prices(coin_ids: Iterable[str], max_age: Optional[int] = None, partial: bool = False) -> PriceMap:
+    """
+    Resolve o preço atual (USD) de várias moedas.
+    1) lê o snapshot no Redis; entradas com idade <= max_age são usadas direto;
+    2) só os misses vão à CoinGecko, numa única chamada bulk (/simple/price),
+       e o resultado realimenta o snapshot.
+    Se a CoinGecko falhar, usa as entradas vencidas do snapshot (listadas em
+    .stale); sem nenhuma, a exceção (ex.: CircuitOpen) sobe para quem chamou —
+    ou, com partial=True, os misses voltam como None e o resto é aproveitado.
+    Devolve {coin_id: preço | None} para cada id distinto.
+    """
+    ids = sorted({c for c in coin_ids if c})
+    if not ids:
+        return PriceMap()
+    out, misses, snap = _from_snapshot(ids, max_age)
+    if not misses:
+        return out
+    try:
+        data = coingecko.simple_price(misses)
+    except Exception as exc:
+        _on_upstream_error(exc, out, misses, snap, partial)
+        return out
+    _apply_fetched(out, misses, snap, data)
+    return out
+
+
+async def aresolve_prices(coin_ids: Iterable[str], max_age: Optional[int] = None, partial: bool = False) -> PriceMap:
+    """Versão async de resolve_prices (misses via coingecko_async)."""
+    ids = sorted({c for c in coin_ids if c})
+    if not ids:
+        return PriceMap()
+    out, misses, snap = await sync_to_async(_from_snapshot, thread_sensitive=False)(ids, max_age)
+    if not misses:
+        return out
+    try:
+        data = await coingecko_async.simple_price(misses)
+    except Exception as exc:
+        _on_upstream_error(exc, out, misses, snap, partial)
+        return out
+    await sync_to_async(_apply_fetched, thread_sensitive=False)(out, misses, snap, data)
+    return out
+
+
+def resolve_price(coin_id: str, max_age: Optional[int] = None) -> Optional[float]:
+    return resolve_prices([coin_id], max_age=max_age).get(coin_id)
+
@@ -0,0 +1,106 @@
+import os
+import math
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Tuple
+
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+# Token bucket global (Redis) para a cota por minuto da CoinGecko, compartilhado
+# por todos os processos web e Celery. Cada chamada ao upstream consome 1 token.
+RATE_PER_MIN = float(os.getenv("COINGECKO_RATE_LIMIT_PER_MIN", "30"))
+BURST = float(os.getenv("COINGECKO_RATE_LIMIT_BURST", str(RATE_PER_MIN)))
+# Fração do bucket que só o tráfego interativo pode consumir: jobs de fundo
+# (beat) param antes de esvaziar o bucket e não matam de fome as views.
+BACKGROUND_RESERVE = float(os.getenv("COINGECKO_RATE_LIMIT_RESERVE", "0.3"))
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+_FLOORS = {INTERACTIVE: 0.0, BACKGROUND: BURST * BACKGROUND_RESERVE}
+
+_BUCKET_KEY = cache.key("ratelimit", "coingecko")
+
+# Refill + consumo atômicos. O relógio é o do Redis (TIME), igual para todos.
+# Retorna {permitido, segundos até haver token para esta prioridade}.
+_ACQUIRE_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local floor = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local now = redis.call('TIME')
+local t = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or t
+tokens = math.min(capacity, tokens + math.max(0, t - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens - cost >= floor then
+  tokens = tokens - cost
+  allowed = 1
+else
+  wait = (floor + cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(t))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2 + 60)
+return {allowed, tostring(wait)}
+"""
+
+# Zera o bucket (com saldo negativo equivalente ao Retry-After) após um 429.
+_DRAIN_LUA = """
+local now = redis.call('TIME')
+local t = tonumber(now[1]) + tonumber(now[2]) / 1000000
+redis.call('HSET', KEYS[1], 'tokens', tostring(-tonumber(ARGV[1]) * tonumber(ARGV[2])), 'ts', tostring(t))
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2])) + 60)
+return 1
+"""
+
+_acquire_script = cache.client().register_script(_ACQUIRE_LUA)
+_drain_script = cache.client().register_script(_DRAIN_LUA)
+
+_priority = contextvars.ContextVar("coingecko_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(name: str):
+    """Define a classe de prioridade das chamadas feitas dentro do bloco."""
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def acquire(prio: str = INTERACTIVE, cost: int = 1) -> Tuple[bool, float]:
+    """
+    Tenta consumir 'cost' tokens. Não dorme: retorna (False, espera_em_s)
+    se não houver orçamento para esta prioridade. Se o Redis falhar, libera.
+    """
+    try:
+        allowed, wait = _acquire_script(
+            keys=[_BUCKET_KEY],
+            args=[RATE_PER_MIN / 60.0, BURST, _FLOORS.get(prio, 0.0), cost],
+        )
+    except Exception as exc:
+        logger.warning("rate limiter indisponível (%s); seguindo sem limite", exc)
+        return True, 0.0
+    return bool(int(allowed)), float(wait)
+
+
+def drain(retry_after: float) -> None:
+    """Após um 429 do upstream, bloqueia todos os processos por ~retry_after segundos."""
+    try:
+        _drain_script(keys=[_BUCKET_KEY], args=[RATE_PER_MIN / 60.0, max(retry_after, 1.0)])
+    except Exception as exc:
+        logger.warning("rate limiter indisponível (%s)", exc)
+
+
+def retry_after_header(wait: float) -> str:
+    return str(max(1, math.ceil(wait)))
@@ -0,0 +1,125 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import universe
+
+logger = logging.getLogger(__name__)
+
+# Índice de busca local (id, símbolo e nome) sobre o universo de mercado.
+# Mapa prefixo -> posições no universo (já em ordem de market cap), montado
+# em memória por processo e remontado em background quando a versão do
+# universo muda, sem que nenhuma request pague a montagem (~150 ms p/ 2500).
+MAX_PREFIX = 16
+BUILD_WAIT = 5.0  # s que a primeira busca de um processo frio espera o índice
+
+
+def _tokens(row: Dict[str, Any]) -> List[str]:
+    coin_id = (row.get("id") or "").lower()
+    symbol = (row.get("symbol") or "").lower()
+    name = (row.get("name") or "").lower()
+    out = {coin_id, symbol, name}
+    out.update(name.split())
+    out.update(coin_id.split("-"))
+    out.discard("")
+    return list(out)
+
+
+class SearchIndex:
+    def __init__(self, rows: List[Dict[str, Any]], version: str):
+        self.rows = rows
+        self.version = version
+        self._prefixes: Dict[str, List[int]] = {}
+        for i, row in enumerate(rows):
+            seen = set()
+            for tok in _tokens(row):
+                for n in range(1, min(len(tok), MAX_PREFIX) + 1):
+                    p = tok[:n]
+                    if p not in seen:
+                        seen.add(p)
+                        self._prefixes.setdefault(p, []).append(i)
+
+    @staticmethod
+    def _score(row: Dict[str, Any], q: str) -> Optional[int]:
+        """Menor é melhor; None = não casa (só acontece com q > MAX_PREFIX)."""
+        symbol = (row.get("symbol") or "").lower()
+        coin_id = (row.get("id") or "").lower()
+        name = (row.get("name") or "").lower()
+        if symbol == q:
+            return 0
+        if coin_id == q or name == q:
+            return 1
+        if symbol.startswith(q):
+            return 2
+        if name.startswith(q) or coin_id.startswith(q):
+            return 3
+        if any(t.startswith(q) for t in _tokens(row)):
+            return 4
+        return None
+
+    def search(self, q: str) -> List[Dict[str, Any]]:
+        """Linhas que casam com 'q', ordenadas por relevância e depois market cap."""
+        q = q.strip().lower()
+        if not q:
+            return []
+        ranked: List[Tuple[int, int]] = []
+        for i in self._prefixes.get(q[:MAX_PREFIX], ()):
+            score = self._score(self.rows[i], q)
+            if score is not None:
+                ranked.append((score, i))
+        ranked.sort()
+        return [self.rows[i] for _, i in ranked]
+
+
+_index: Optional[SearchIndex] = None
+_building: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+
+def _build(version: str) -> None:
+    global _index
+    try:
+        idx = SearchIndex(universe.all_rows(), version)
+    except Exception as exc:
+        logger.warning("falha ao montar o índice de busca (%s)", exc)
+        return
+    with _lock:
+        _index = idx
+
+
+def _schedule(version: str) -> threading.Thread:
+    """Uma montagem por vez, numa thread; devolve a que está rodando."""
+    global _building
+    with _lock:
+        # depois de um fork a thread herdada do pai não está viva
+        if _building is None or not _building.is_alive():
+            _building = threading.Thread(target=_build, args=(version,), name="search-index", daemon=True)
+            _building.start()
+        return _building
+
+
+def warm() -> None:
+    """Monta o índice em background (chamado no boot de cada worker, ver gunicorn.conf.py)."""
+    version = universe.version()
+    if version != "0":
+        _schedule(version)
+
+
+def get_index() -> Optional[SearchIndex]:
+    """
+    Índice do universo (None se ele ainda não foi aquecido). Quando a versão
+    muda, o índice novo é montado em background e o anterior continua
+    respondendo até ficar pronto; só um processo sem índice nenhum (warm()
+    ainda rodando) espera a montagem, por até BUILD_WAIT s.
+    """
+    version = universe.version()
+    if version == "0":
+        return None
+    idx = _index
+    if idx is not None and idx.version == version:
+        return idx
+    thread = _schedule(version)
+    if idx is None:
+        thread.join(BUILD_WAIT)
+        idx = _index
+    return idx
@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+from array import array
+from typing import Any, Dict, List, Optional
+
+from . import coingecko, coingecko_async, cache
+
+# Série histórica local de preços: UMA série por moeda no Redis, com
+#   ct:series:<coin_id>  hash {ts: float64[], px: float64[] (little-endian), meta: json}
+# alimentada incrementalmente pelo /market_chart. Todo ?days= vira um recorte
+# da mesma série. A resolução acompanha a idade do ponto, como na CoinGecko:
+# 5 min nas últimas 24h, 1h até 90 dias, 1 dia além disso.
+NS = "series"
+FRESHNESS = float(os.getenv("COIN_SERIES_FRESHNESS", "120"))  # s até buscar a janela recente de novo
+LOCK_TIMEOUT = 30
+
+MIN5, HOUR, DAY = 300_000, 3_600_000, 86_400_000  # ms
+
+# Tier de resolução que cada 'days' da CoinGecko devolve (fine < hourly < daily)
+_TIERS = ("fine", "hourly", "daily")
+
+
+def _tier(days: str) -> str:
+    if days == "max":
+        return "daily"
+    n = int(days)
+    return "fine" if n <= 1 else "hourly" if n <= 90 else "daily"
+
+
+def _window_start(days: str, now: float) -> float:
+    return 0.0 if days == "max" else now - int(days) * DAY
+
+
+def _pack(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array("d", values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack(raw: bytes) -> array:
+    values = array("d")
+    values.frombytes(raw)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _load(coin_id: str) -> Optional[Dict[str, Any]]:
+    raw = cache.client().hgetall(cache.key(NS, coin_id))
+    if not raw or b"meta" not in raw:
+        return None
+    meta = json.loads(raw[b"meta"])
+    return {"ts": _unpack(raw.get(b"ts", b"")), "px": _unpack(raw.get(b"px", b"")), **meta}
+
+
+def _save(coin_id: str, state: Dict[str, Any]) -> None:
+    meta = {"cov": state["cov"], "updated": state["updated"]}
+    cache.client().hset(cache.key(NS, coin_id), mapping={
+        "ts": _pack(state["ts"]), "px": _pack(state["px"]), "meta": json.dumps(meta),
+    })
+
+
+def _covered_from(state: Dict[str, Any], tier: str) -> float:
+    # dados mais finos também cobrem as resoluções mais grossas
+    finer = _TIERS[:_TIERS.index(tier) + 1]
+    return min((state["cov"][t] for t in finer if t in state["cov"]), default=math.inf)
+
+
+def _plan(state: Optional[Dict[str, Any]], days: str, now: float) -> Optional[str]:
+    """Qual 'days' buscar no upstream para atender o pedido (None = a série local já basta)."""
+    if state is None or _covered_from(state, _tier(days)) > _window_start(days, now):
+        return days
+    gap = now - state["updated"]
+    if gap <= FRESHNESS * 1000:
+        return None
+    # incremental: só a janela recente desde a última atualização
+    gap_days = gap / DAY
+    if gap_days <= 1:
+        return "1"
+    if gap_days <= 90:
+        return str(math.ceil(gap_days))
+    return days
+
+
+def _bucket(t: float, now: float):
+    age = now - t
+    if age <= DAY:
+        return 0, t // MIN5
+    if age <= 90 * DAY:
+        return 1, t // HOUR
+    return 2, t // DAY
+
+
+def _apply(state: Optional[Dict[str, Any]], prices: List[List[float]], days: str, now: float) -> Dict[str, Any]:
+    """Mescla pontos recém-buscados na série e recompacta por idade (último ponto de cada bucket)."""
+    if state is None or now - state["updated"] > 90 * DAY:
+        state = {"ts": array("d"), "px": array("d"), "cov": {}, "updated": 0.0}
+    points = dict(zip(state["ts"], state["px"]))
+    points.update((float(t), float(p)) for t, p in prices if p is not None)
+
+    ts, px = array("d"), array("d")
+    last_bucket = None
+    for t in sorted(points, reverse=True):
+        b = _bucket(t, now)
+        if b != last_bucket:
+            ts.append(t)
+            px.append(points[t])
+            last_bucket = b
+    ts.reverse()
+    px.reverse()
+
+    tier = _tier(days)
+    cov = dict(state["cov"])
+    if now - state["updated"] > FRESHNESS * 1000:
+        # o trecho desde a última atualização veio só na resolução de 'tier':
+        # as mais finas deixam de ser contínuas até agora e são rebuscadas
+        for finer in _TIERS[:_TIERS.index(tier)]:
+            cov.pop(finer, None)
+    cov[tier] = min(cov.get(tier, math.inf), _window_start(days, now))
+    return {"ts": ts, "px": px, "cov": cov, "updated": now}
+
+
+def _slice(state: Dict[str, Any], days: str, now: float) -> List[List[float]]:
+    start = _window_start(days, now)
+    return [[int(t), p] for t, p in zip(state["ts"], state["px"]) if t >= start]
+
+
+def _lock(coin_id: str):
+    # thread_local=False: no caminho async o lock é liberado de outra thread
+    return cache.client().lock(
+        cache.key(NS, "lock", coin_id), timeout=LOCK_TIMEOUT,
+        blocking_timeout=cache.FILL_WAIT + coingecko.DEFAULT_TIMEOUT, thread_local=False,
+    )
+
+
+def get_range(coin_id: str, days: str) -> List[List[float]]:
+    """
+    Pontos [timestamp_ms, preço] dos últimos 'days' (ou 'max') de coin_id,
+    buscando no upstream só o que falta na série local.
+    """
+    now = time.time() * 1000
+    state = _load(coin_id)
+    if _plan(state, days, now) is None:
+        return _slice(state, days, now)
+    lock = _lock(coin_id)
+    if not lock.acquire():
+        raise cache.FillTimeout(f"series update in progress for {coin_id}")
+    try:
+        state = _load(coin_id)  # outro processo pode ter atualizado enquanto esperávamos
+        fetch_days = _plan(state, days, now)
+        if fetch_days is not None:
+            raw = coingecko.coin_chart(coin_id, fetch_days)
+            state = _apply(state, raw.get("prices", []), fetch_days, now)
+            _save(coin_id, state)
+    finally:
+        lock.release()
+    return _slice(state, days, now)
+
+
+async def aget_range(coin_id: str, days: str) -> List[List[float]]:
+    """Versão async de get_range (upstream via coingecko_async)."""
+    now = time.time() * 1000
+    state = await asyncio.to_thread(_load, coin_id)
+    if _plan(state, days, now) is None:
+        return _slice(state, days, now)
+    lock = _lock(coin_id)
+    if not await asyncio.to_thread(lock.acquire):
+        raise cache.FillTimeout(f"series update in progress for {coin_id}")
+    try:
+        state = await asyncio.to_thread(_load, coin_id)
+        fetch_days = _plan(state, days, now)
+        if fetch_days is not None:
+            raw = await coingecko_async.coin_chart(coin_id, fetch_days)
+            state = _apply(state, raw.get("prices", []), fetch_days, now)
+            await asyncio.to_thread(_save, coin_id, state)
+    finally:
+        await asyncio.to_thread(lock.release)
+    return _slice(state, days, now)
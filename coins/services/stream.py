@@ -0,0 +1,125 @@
+import os
+import json
+import asyncio
+import logging
+import weakref
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Set
+
+import redis.asyncio as aioredis
+
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+# Fan-out de eventos para streams SSE (ASGI).
+# O update_coin_prices_cache publica em PRICES_CHANNEL só as moedas cujo preço
+# mudou no tick ({coin_id: {price, change_24h}}). Cada processo ASGI mantém UMA
+# assinatura Redis por canal (Hub) e distribui para os assinantes em memória,
+# indexados por chave (moeda, usuário...): o custo de um assinante ocioso é
+# um objeto pequeno e um Event, sem fila — updates pendentes são coalescidos
+# por chave (cliente lento recebe só o último preço de cada moeda).
+PRICES_CHANNEL = cache.key("stream", "prices")
+MAX_COINS = int(os.getenv("STREAM_MAX_COINS", "100"))          # moedas por conexão
+HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "15"))         # s entre keep-alives
+RECONNECT_DELAY = 1.0
+
+
+def publish_prices(changes: Dict[str, Dict[str, Any]]) -> None:
+    """Publica os deltas de preço de um tick (lado Celery/sync)."""
+    if changes:
+        cache.client().publish(PRICES_CHANNEL, json.dumps(changes, separators=(",", ":")))
+
+
+class Subscriber:
+    __slots__ = ("keys", "pending", "event", "__weakref__")
+
+    def __init__(self, keys: Set[str]):
+        self.keys = keys
+        self.pending: Dict[str, Any] = {}
+        self.event = asyncio.Event()
+
+    async def next(self, timeout: float) -> Dict[str, Any]:
+        """Updates acumulados desde a última chamada ({} se deu timeout)."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        self.event.clear()
+        out, self.pending = self.pending, {}
+        return out
+
+
+class Hub:
+    """
+    Uma assinatura Redis (canal 'channel') por event loop, repartida entre os
+    assinantes locais. Cada mensagem é um json {chave: update}; quem assinou a
+    chave (moeda, usuário...) recebe o update e é acordado.
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self._by_key: Dict[str, Set[Subscriber]] = defaultdict(set)
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, keys: Iterable[str]) -> Subscriber:
+        sub = Subscriber(set(keys))
+        for k in sub.keys:
+            self._by_key[k].add(sub)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        for k in sub.keys:
+            subs = self._by_key.get(k)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_key[k]
+
+    @property
+    def subscribers(self) -> int:
+        return len({s for subs in self._by_key.values() for s in subs})
+
+    def dispatch(self, changes: Dict[str, Any]) -> None:
+        touched = set()
+        for k, update in changes.items():
+            for sub in self._by_key.get(k, ()):
+                sub.pending[k] = update
+                touched.add(sub)
+        for sub in touched:
+            sub.event.set()
+
+    async def _run(self) -> None:
+        while True:
+            client = aioredis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"))
+            try:
+                async with client.pubsub(ignore_subscribe_messages=True) as ps:
+                    await ps.subscribe(self.channel)
+                    async for msg in ps.listen():
+                        self.dispatch(json.loads(msg["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("assinatura de %s caiu (%s); reconectando", self.channel, exc)
+                await asyncio.sleep(RECONNECT_DELAY)
+            finally:
+                await client.aclose()
+
+
+_hubs: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Hub]]" = weakref.WeakKeyDictionary()
+
+
+def get_hub(channel: str = PRICES_CHANNEL) -> Hub:
+    loop = asyncio.get_running_loop()
+    hubs = _hubs.setdefault(loop, {})
+    hub = hubs.get(channel)
+    if hub is None:
+        hub = hubs[channel] = Hub(channel)
+    return hub
+
+
+def sse(event: str, data: Any, event_id: Optional[str] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+from . import coingecko, cache, payloads
+
+logger = logging.getLogger(__name__)
+
+# "Universo" de mercado: as top UNIVERSE_SIZE moedas por market cap, buscadas
+# em páginas de 250 pelo update_coin_prices_cache e guardadas numa lista Redis
+# (uma linha JSON compacta por moeda, na ordem do ranking). O CoinsListView
+# serve qualquer page/per_page fatiando a lista (LRANGE), sem ir à CoinGecko.
+#   ct:universe:rows   lista de linhas (market_row)
+#   ct:universe:meta   {"version", "count", "cached_at"}
+NS = "universe"
+UNIVERSE_SIZE = int(os.getenv("COIN_UNIVERSE_SIZE", "2500"))
+PAGE_SIZE = 250
+MAX_AGE = int(os.getenv("COIN_UNIVERSE_MAX_AGE", "3600"))  # s sem refresh até o universo expirar
+META_TTL = 1.0  # s que cada processo reaproveita o meta lido do Redis
+
+_meta_memo = (0.0, None)
+
+
+def refresh() -> List[Dict[str, Any]]:
+    """
+    Busca o universo na CoinGecko e troca a lista no Redis de forma atômica
+    (monta numa chave temporária e faz RENAME). Se uma página falhar no meio,
+    o universo anterior continua publicado, a menos que o parcial cubra pelo
+    menos as mesmas moedas (ou não haja anterior). Retorna o payload bruto de
+    /coins/markets, mesmo parcial (o snapshot de preços aproveita o que veio).
+    """
+    data: List[Dict[str, Any]] = []
+    failed = None
+    pages = -(-UNIVERSE_SIZE // PAGE_SIZE)
+    for page in range(1, pages + 1):
+        try:
+            chunk = coingecko.list_markets(page=page, per_page=PAGE_SIZE)
+        except Exception as exc:
+            if not data:
+                raise
+            failed = (page, exc)
+            break
+        data.extend(chunk)
+        if len(chunk) < PAGE_SIZE:
+            break
+    data = data[:UNIVERSE_SIZE]
+    if not data:
+        return data
+
+    if failed:
+        previous = cache.get_json(NS, "meta")
+        if previous and len(data) < previous["count"]:
+            logger.warning("página %d do universo falhou (%s); mantendo o anterior (%d moedas, %d vieram)",
+                           failed[0], failed[1], previous["count"], len(data))
+            return data
+        logger.warning("universo parcial: página %d falhou (%s)", *failed)
+
+    r = cache.client()
+    rows_key, tmp_key = cache.key(NS, "rows"), cache.key(NS, "rows", "tmp")
+    meta = {"version": str(int(time.time() * 1000)), "count": len(data), "cached_at": cache.now_iso()}
+    pipe = r.pipeline()
+    pipe.delete(tmp_key)
+    pipe.rpush(tmp_key, *[json.dumps(payloads.market_row(c), separators=(",", ":")) for c in data])
+    pipe.rename(tmp_key, rows_key)
+    # sem refresh por MAX_AGE (beat parado, upstream fora) o universo some e
+    # o /api/coins/ volta a buscar na CoinGecko em vez de servir dados velhos
+    pipe.expire(rows_key, MAX_AGE)
+    pipe.set(cache.key(NS, "meta"), json.dumps(meta), ex=MAX_AGE)
+    pipe.execute()
+    return data
+
+
+def meta() -> Optional[Dict[str, Any]]:
+    global _meta_memo
+    expires, m = _meta_memo
+    if time.monotonic() < expires:
+        return m
+    m = cache.get_json(NS, "meta")
+    _meta_memo = (time.monotonic() + META_TTL, m)
+    return m
+
+
+def version() -> str:
+    m = meta()
+    return m["version"] if m else "0"
+
+
+def rows(start: int, stop: int) -> List[Dict[str, Any]]:
+    """Linhas [start, stop) do universo."""
+    if stop <= start:
+        return []
+    raw = cache.client().lrange(cache.key(NS, "rows"), start, stop - 1)
+    return [json.loads(v) for v in raw]
+
+
+def all_rows() -> List[Dict[str, Any]]:
+    return rows(0, UNIVERSE_SIZE)
@@ -1,23 +1,46 @@
-from celery import shared_task
-from .services import coingecko, cache
+from celery import shared_task, current_app
+import logging
+
+from .services import coingecko, cache, prices, ratelimit, payloads, universe, stream, catalog
+
+logger = logging.getLogger(__name__)
 
 @shared_task
 def update_coin_prices_cache():
-    # Atualiza cache da lista top 100
-    data = coingecko.list_markets(page=1, per_page=100)
-    out = {"count":100,"next":None,"previous":None,"results":[]}
-    for c in data:
-        out["results"].append({
-            "id": c["id"], "symbol": c["symbol"], "name": c["name"],
-            "image": c.get("image"),
-            "current_price": c.get("current_price"),
-            "price_change_24h": c.get("price_change_24h"),
-            "price_change_percentage_24h": c.get("price_change_percentage_24h"),
-            "market_cap": c.get("market_cap"),
-            "market_cap_rank": c.get("market_cap_rank"),
-            "total_volume": c.get("total_volume"),
-            "high_24h": c.get("high_24h"),
-            "low_24h": c.get("low_24h"),
-            "cached": True, "cached_at": cache.now_iso(),
-        })
-    cache.set_json("coins:list", out, 300, "1", "100", "")
+    # Atualiza o universo de mercado (top COIN_UNIVERSE_SIZE, páginas de 250)
+    # com prioridade de fundo no rate limiter
+    try:
+        with ratelimit.priority(ratelimit.BACKGROUND):
+            data = universe.refresh()
+    except coingecko.UpstreamUnavailable as exc:
+        # sem orçamento no rate limiter ou circuit breaker aberto
+        logger.warning("update_coin_prices_cache: %s; pulando este tick", exc)
+        return
+    # snapshot de preços lido por portfólio, serializers e alertas
+    changes = prices.snapshot_from_markets(data)
+    # deltas para os streams SSE de /api/stream/prices/
+    stream.publish_prices(changes)
+    tick = {c["id"]: c.get("current_price") for c in data if c.get("current_price") is not None}
+    # dispara na hora os alertas atingidos por este tick (índice ordenado em portfolio)
+    current_app.send_task("portfolio.tasks.fire_alerts_for_prices", args=[tick])
+    # e reavalia as valuations materializadas de quem tem essas moedas
+    current_app.send_task("portfolio.tasks.revalue_portfolios", args=[tick])
+    return {"coins": len(data)}
+
+
+@shared_task
+def refresh_coin_cache(ns, ttl, parts, args, last_known=False):
+    """
+    Refresh em background de uma entrada de cache que ficou stale
+    (stale-while-revalidate). ns ∈ payloads.FETCHERS; args vão para o fetcher.
+    """
+    fetch = payloads.FETCHERS[ns]
+    with ratelimit.priority(ratelimit.BACKGROUND):
+        cache.refill(ns, ttl, lambda: fetch(*args), *parts, last_known=last_known)
+
+
+@shared_task
+def refresh_coin_catalog():
+    """Recarrega o catálogo local de metadados (CoinMetadata) usado nos create do portfolio."""
+    with ratelimit.priority(ratelimit.BACKGROUND):
+        return catalog.refresh()
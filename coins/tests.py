@@ -1,3 +1,435 @@
-from django.test import TestCase
+import os
+import time
+import asyncio
+import threading
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import httpx
+
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from coins.models import CoinMetadata
+from coins.services import cache, catalog, coingecko, coingecko_async, packed, prices, ratelimit, search, series, universe
+from coins import views
+from coins.views import cached_response
+from coins.services.downsample import lttb
+
+try:
+    import fakeredis
+except ImportError:  # requirements-dev.txt
+    fakeredis = None
+
+DAY_MS = 86_400_000
+
+
+class PackedSeriesTests(SimpleTestCase):
+    def test_round_trip_small_deltas(self):
+        prices = [[1_700_000_000_000 + i * 300_000, 30_000.0 + i] for i in range(288)]
+        raw = packed.pack(prices)
+        self.assertEqual(raw[:4], packed.MAGIC)
+        self.assertEqual(packed.to_pairs(raw), prices)
+
+    def test_round_trip_daily_series_downsampled_to_10_points(self):
+        # série diária de ~4 anos reduzida a 10 pontos: deltas de ~146 dias (> int32 ms)
+        daily = [[1_500_000_000_000 + i * DAY_MS, 1000.0 + (i % 37) * 3.5] for i in range(1460)]
+        points = lttb(daily, 10)
+        raw = packed.pack(points)
+        self.assertEqual(raw[:4], packed.MAGIC_ABSOLUTE)
+        pairs = packed.to_pairs(raw)
+        self.assertEqual(pairs, [[int(t), float(p)] for t, p in points])
+        self.assertEqual(pairs, sorted(pairs))
+
+    def test_empty_series(self):
+        self.assertEqual(packed.to_pairs(packed.pack([])), [])
+
+
+class CachedResponseETagTests(SimpleTestCase):
+    def setUp(self):
+        self.entry = cache.Entry.build({"id": "bitcoin"}, 60)
+
+    def test_hit_sends_cached_bytes_with_strong_etag(self):
+        resp = cached_response(RequestFactory().get("/"), self.entry, cache.HIT)
+        self.assertEqual(resp.content, self.entry.body)
+        self.assertEqual(resp["ETag"], self.entry.etag)
+
+    def test_miss_rendered_by_drf_gets_weak_etag(self):
+        resp = cached_response(RequestFactory().get("/"), self.entry, cache.MISS)
+        self.assertEqual(resp["ETag"], "W/" + self.entry.etag)
+        self.assertIn("Accept", resp["Vary"])
+
+    @mock.patch.object(views, "RAW_RESPONSES", False)
+    def test_binary_hit_without_raw_responses_sends_packed_bytes(self):
+        body = packed.pack([[1_700_000_000_000, 1.0], [1_700_000_300_000, 2.0]])
+        # como volta do Redis: Entry.loads precisa lembrar que o corpo é binário
+        entry = cache.Entry.loads(cache.Entry.build(body, 60).dumps())
+        self.assertEqual(entry.value, body)
+        resp = cached_response(RequestFactory().get("/"), entry, cache.HIT, content_type=packed.MEDIA_TYPE)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content, body)
+        self.assertEqual(resp["ETag"], entry.etag)
+
+    def test_weak_etag_still_revalidates(self):
+        request = RequestFactory().get("/", HTTP_IF_NONE_MATCH="W/" + self.entry.etag)
+        resp = cached_response(request, self.entry, cache.MISS)
+        self.assertEqual(resp.status_code, 304)
+
+
+@skipUnless(fakeredis, "fakeredis[lua] não instalado")
+@mock.patch.multiple(universe, UNIVERSE_SIZE=6, PAGE_SIZE=2)
+class UniverseRefreshTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        patcher = mock.patch.object(cache, "_redis", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _markets(self, fail_page=None):
+        def list_markets(page, per_page):
+            if page == fail_page:
+                raise RuntimeError("CoinGecko 500")
+            return [{"id": f"coin-{page}-{i}", "current_price": 1.0} for i in range(per_page)]
+        return mock.patch.object(universe.coingecko, "list_markets", side_effect=list_markets)
+
+    def _ids(self):
+        return [row["id"] for row in universe.rows(0, 10)]
+
+    def test_failed_page_keeps_previous_universe(self):
+        with self._markets():
+            universe.refresh()
+        before = self._ids()
+        with self._markets(fail_page=2):
+            data = universe.refresh()
+        self.assertEqual(len(data), 2)  # o snapshot de preços ainda usa o parcial
+        self.assertEqual(self._ids(), before)
+        self.assertEqual(cache.get_json(universe.NS, "meta")["count"], 6)
+
+    def test_partial_published_when_there_is_no_previous(self):
+        with self._markets(fail_page=3):
+            universe.refresh()
+        self.assertEqual(len(self._ids()), 4)
+
+    def test_universe_expires(self):
+        with self._markets():
+            universe.refresh()
+        self.assertGreater(self.redis.ttl(cache.key(universe.NS, "rows")), 0)
+        self.assertGreater(self.redis.ttl(cache.key(universe.NS, "meta")), 0)
+
+
+class AsyncClientLifecycleTests(SimpleTestCase):
+    def setUp(self):
+        self.clients = []
+
+        def new_client():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={})))
+            self.clients.append(client)
+            return client
+
+        for target, value in (("_new_client", new_client), ("_before_attempt", lambda prio: None),
+                              ("_record_outcome", lambda status: None)):
+            patcher = mock.patch.object(coingecko_async, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def _ping_twice(self):
+        await coingecko_async.ping()
+        await coingecko_async.ping()
+
+    def test_short_lived_loop_closes_its_clients(self):
+        with mock.patch.object(coingecko_async, "SHARED_CLIENT", False):
+            asyncio.run(self._ping_twice())
+        self.assertEqual(len(self.clients), 2)
+        self.assertTrue(all(c.is_closed for c in self.clients))
+
+    def test_asgi_worker_reuses_one_client(self):
+        with mock.patch.object(coingecko_async, "SHARED_CLIENT", True):
+            asyncio.run(self._ping_twice())
+        self.assertEqual(len(self.clients), 1)
+
+
+@skipUnless(fakeredis, "fakeredis[lua] não instalado")
+class ResolvePricesOutageTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(cache, "_redis", fakeredis.FakeStrictRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        prices.write_snapshot({"bitcoin": {"price": 100.0}})
+        outage = mock.patch.object(prices.coingecko, "simple_price", side_effect=coingecko.CircuitOpen(30))
+        outage.start()
+        self.addCleanup(outage.stop)
+
+    def test_outage_without_snapshot_raises(self):
+        with self.assertRaises(coingecko.CircuitOpen):
+            prices.resolve_prices(["bitcoin", "ethereum"])
+
+    def test_partial_keeps_what_resolved(self):
+        price_map = prices.resolve_prices(["bitcoin", "ethereum"], partial=True)
+        self.assertEqual(price_map, {"bitcoin": 100.0, "ethereum": None})
+        self.assertEqual(price_map.stale, {"ethereum"})
+
+
+class FanOutDeadlineTests(SimpleTestCase):
+    def setUp(self):
+        self.tokens = 0
+
+        def acquire(prio):
+            self.tokens += 1
+            return True, 0.0
+
+        for target, name, value in ((coingecko.breaker, "allow", lambda: (True, 0.0)),
+                                    (coingecko.ratelimit, "acquire", acquire)):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _slow_then_retry(self, key):
+        time.sleep(0.2)
+        coingecko._before_attempt("x")  # a "próxima tentativa" de uma tarefa atrasada
+        return key
+
+    def test_single_key_respects_deadline(self):
+        with self.assertRaises(coingecko.DeadlineExceeded):
+            coingecko._fan_out(self._slow_then_retry, ["a"], deadline=0.05)
+
+    def test_late_task_stops_taking_tokens(self):
+        out = coingecko._fan_out(lambda k: k if k == "fast" else self._slow_then_retry(k), ["fast", "slow"],
+                                 deadline=0.05)
+        self.assertEqual(out, {"fast": "fast"})
+        time.sleep(0.3)
+        self.assertEqual(self.tokens, 0)
+
+
+class SeriesCoverageTests(SimpleTestCase):
+    def test_hourly_gap_fill_invalidates_fine_coverage(self):
+        then = 1_700_000_000_000.0
+        state = series._apply(None, [[then - i * series.MIN5, 100.0] for i in range(288)], "1", then)
+        self.assertIsNone(series._plan(state, "1", then + 60_000))
+
+        now = then + 3 * series.DAY
+        self.assertEqual(series._plan(state, "1", now), "3")
+        hourly = [[now - i * series.HOUR, 110.0] for i in range(72)]
+        state = series._apply(state, hourly, "3", now)
+        self.assertNotIn("fine", state["cov"])
+        # days=1 volta ao upstream em vez de servir a janela em pontos de hora
+        self.assertEqual(series._plan(state, "1", now), "1")
+
+    def test_gap_fill_within_freshness_keeps_fine_coverage(self):
+        then = 1_700_000_000_000.0
+        state = series._apply(None, [[then, 100.0]], "1", then)
+        state = series._apply(state, [[then + 1000, 101.0]], "7", then + 1000)
+        self.assertIn("fine", state["cov"])
+
+
+class SearchIndexBuildTests(SimpleTestCase):
+    V1 = [{"id": "bitcoin", "symbol": "btc", "name": "Bitcoin"}]
+    V2 = V1 + [{"id": "bitcoin-cash", "symbol": "bch", "name": "Bitcoin Cash"}]
+
+    def setUp(self):
+        for name in ("_index", "_building"):
+            patcher = mock.patch.object(search, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.version = "1"
+        self.rows = self.V1
+        self.release = threading.Event()
+        self.release.set()
+
+        def all_rows():
+            self.release.wait(5)
+            return self.rows
+
+        for name, value in (("version", lambda: self.version), ("all_rows", all_rows)):
+            patcher = mock.patch.object(universe, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_cold_process_waits_for_first_build(self):
+        self.assertEqual(len(search.get_index().search("bit")), 1)
+
+    def test_new_version_builds_in_background_while_old_index_answers(self):
+        old = search.get_index()
+        self.version, self.rows = "2", self.V2
+        self.release.clear()
+        self.assertIs(search.get_index(), old)  # não espera a montagem
+        self.release.set()
+        search._building.join(5)
+        self.assertEqual(len(search.get_index().search("bit")), 2)
+
+
+@skipUnless(fakeredis, "fakeredis[lua] não instalado")
+@mock.patch.multiple(ratelimit, RATE_PER_MIN=60.0, BURST=10.0,
+                     _FLOORS={ratelimit.INTERACTIVE: 0.0, ratelimit.BACKGROUND: 3.0})
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        for name, lua in (("_acquire_script", ratelimit._ACQUIRE_LUA), ("_drain_script", ratelimit._DRAIN_LUA)):
+            patcher = mock.patch.object(ratelimit, name, self.redis.register_script(lua))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _drain_to(self, tokens, age=0.0):
+        sec, usec = self.redis.time()
+        self.redis.hset(ratelimit._BUCKET_KEY, mapping={"tokens": tokens, "ts": sec + usec / 1e6 - age})
+
+    def test_full_bucket_allows_burst_then_waits(self):
+        for _ in range(10):
+            self.assertTrue(ratelimit.acquire()[0])
+        allowed, wait = ratelimit.acquire()
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 1.0, delta=0.05)  # 1 token/s
+
+    def test_refill_by_elapsed_time(self):
+        self._drain_to(0, age=4.0)
+        for _ in range(4):
+            self.assertTrue(ratelimit.acquire()[0])
+        self.assertFalse(ratelimit.acquire()[0])
+
+    def test_background_stops_at_its_floor(self):
+        self._drain_to(4)
+        self.assertTrue(ratelimit.acquire(ratelimit.BACKGROUND)[0])
+        allowed, wait = ratelimit.acquire(ratelimit.BACKGROUND)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 1.0, delta=0.05)
+        # a reserva continua disponível para o tráfego interativo
+        self.assertTrue(ratelimit.acquire(ratelimit.INTERACTIVE)[0])
+
+    def test_drained_bucket_returns_wait(self):
+        ratelimit.drain(5)
+        allowed, wait = ratelimit.acquire()
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 6.0, delta=0.05)  # Retry-After + 1 token
+
+
+@skipUnless(fakeredis, "fakeredis[lua] não instalado")
+class FakeCacheTestCase(SimpleTestCase):
+    """cache.py sobre fakeredis, com L1 vazio e sem a thread de invalidação."""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        for name, value in (("_redis", self.redis), ("_l1", cache._LRU(cache.L1_SIZE, cache.L1_TTL)),
+                            ("_listener_pid", os.getpid()),
+                            ("_release_lock", self.redis.register_script(cache._release_lock.script))):
+            patcher = mock.patch.object(cache, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.calls = 0
+
+    def fetch(self):
+        self.calls += 1
+        return {"n": self.calls}
+
+
+class SingleFlightTests(FakeCacheTestCase):
+    def _hold_lock(self):
+        self.redis.set(cache.key("lock", "t", "k"), "other-worker", px=60_000)
+
+    def test_leader_fills_once(self):
+        entry, state = cache.get_or_fill("t", 60, self.fetch, "k")
+        self.assertEqual((entry.value, state), ({"n": 1}, cache.MISS))
+        entry, state = cache.get_or_fill("t", 60, self.fetch, "k")
+        self.assertEqual((entry.value["n"], state), (1, cache.HIT))
+        self.assertEqual(self.calls, 1)
+
+    def test_waiter_reads_leader_result(self):
+        self._hold_lock()
+        leader = threading.Timer(0.1, cache.set_entry, args=("t", {"from": "leader"}, 60, "k"))
+        leader.start()
+        self.addCleanup(leader.cancel)
+        entry, state = cache.get_or_fill("t", 60, self.fetch, "k")
+        self.assertEqual(state, cache.HIT)
+        self.assertEqual(entry.value["from"], "leader")
+        self.assertEqual(self.calls, 0)
+
+    @mock.patch.object(cache, "FILL_WAIT", 0.2)
+    def test_waiter_times_out_when_holder_never_fills(self):
+        self._hold_lock()
+        with self.assertRaises(cache.FillTimeout):
+            cache.get_or_fill("t", 60, self.fetch, "k")
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(cache.single_flight_stats().get("timeout"), 1)
+
+
+class StaleWhileRevalidateTests(FakeCacheTestCase):
+    def test_stale_entry_served_now_with_one_background_refresh(self):
+        cache.set_entry("t", {"v": "old"}, 60, "k")
+        refresh = mock.Mock()
+        with mock.patch.object(time, "time", return_value=time.time() + 120):  # soft venceu, ainda servível
+            for _ in range(3):
+                entry, state = cache.get_or_fill("t", 60, self.fetch, "k", refresh=refresh)
+                self.assertEqual((entry.value["v"], state), ("old", cache.STALE))
+        refresh.assert_called_once_with()
+        self.assertEqual(self.calls, 0)  # ninguém esperou o upstream
+
+
+class L1CacheTests(FakeCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.set_entry("t", {"v": 1}, 60, "k")
+        self.assertEqual(cache.get_raw_entry("t", "k").value["v"], 1)  # popula o L1
+
+    def test_hit_in_l1_skips_redis(self):
+        with mock.patch.object(self.redis, "get", wraps=self.redis.get) as get:
+            self.assertEqual(cache.get_raw_entry("t", "k").value["v"], 1)
+        get.assert_not_called()
+
+    def test_invalidate_evicts_entry(self):
+        cache.invalidate("t", "k")
+        self.assertIsNone(cache.get_raw_entry("t", "k"))
+
+    def test_expired_entry_goes_back_to_redis(self):
+        self.redis.delete(cache.key("t", "k"))  # só o L1 ainda tem a entrada
+        self.assertIsNotNone(cache.get_raw_entry("t", "k"))
+        with mock.patch.object(time, "monotonic", return_value=time.monotonic() + cache.L1_TTL + 1):
+            self.assertIsNone(cache.get_raw_entry("t", "k"))
+
+
+class LTTBTests(SimpleTestCase):
+    def setUp(self):
+        self.points = [[1_000 * i, float((i * 7919) % 101)] for i in range(500)]
+
+    def test_exact_length_keeping_first_and_last(self):
+        for n in (3, 10, 99, 499):
+            out = lttb(self.points, n)
+            self.assertEqual(len(out), n)
+            self.assertEqual((out[0], out[-1]), (self.points[0], self.points[-1]))
+            self.assertEqual([t for t, _ in out], sorted({t for t, _ in out}))  # sem repetir/desordenar
+
+    def test_keeps_extremes(self):
+        points = [[i, 1.0] for i in range(100)]
+        points[40][1], points[70][1] = 50.0, -50.0
+        out = lttb(points, 10)
+        self.assertIn([40, 50.0], out)
+        self.assertIn([70, -50.0], out)
+
+    def test_passthrough_when_already_small(self):
+        short = self.points[:10]
+        self.assertIs(lttb(short, 10), short)
+        self.assertIs(lttb(short, 50), short)
+
+
+@skipUnless(fakeredis, "fakeredis[lua] não instalado")
+class CoinInfoTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        patcher = mock.patch.object(cache, "_redis", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_catalog_hit_skips_upstream(self):
+        CoinMetadata.objects.create(coin_id="bitcoin", name="Bitcoin", symbol="b" * 30, image="https://x/btc.png")
+        with mock.patch.object(catalog.coingecko, "coin_detail") as detail:
+            info = catalog.coin_info("bitcoin")
+        detail.assert_not_called()
+        self.assertEqual(info, {"name": "Bitcoin", "symbol": "b" * catalog.SYMBOL_MAX, "image": "https://x/btc.png"})
+
+    def test_unknown_coin_falls_back_to_upstream(self):
+        detail = {
+            "name": "Ethereum", "symbol": "eth", "image": {"thumb": "https://x/eth-t.png"},
+            "market_data": {"current_price": {"usd": 3000.0}, "price_change_percentage_24h": -1.5},
+        }
+        with mock.patch.object(catalog.coingecko, "coin_detail", return_value=detail) as upstream:
+            info = catalog.coin_info("ethereum")
+        upstream.assert_called_once_with("ethereum")
+        self.assertEqual(info, {"name": "Ethereum", "symbol": "eth", "image": "https://x/eth-t.png"})
+        self.assertTrue(CoinMetadata.objects.filter(coin_id="ethereum", symbol="eth").exists())
+        snap = prices.read_snapshot(["ethereum"])["ethereum"]
+        self.assertEqual((snap["price"], snap["change_24h"], snap["name"]), (3000.0, -1.5, "Ethereum"))
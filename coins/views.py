@@ -1,26 +1,121 @@
 from rest_framework import views, response, permissions, status
 from django.conf import settings
-from urllib.parse import urlencode
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from rest_framework.settings import api_settings
 
-from .services import coingecko, cache
+from . import tasks
+from .renderers import PackedSeriesRenderer
+from .services import coingecko, cache, ratelimit, payloads, universe, packed
 
 LIST_TTL = int(getattr(settings, "COIN_LIST_CACHE_TTL", 120))
 DETAIL_TTL = int(getattr(settings, "COIN_DETAIL_CACHE_TTL", 300))
 CHART_TTL = int(getattr(settings, "COIN_CHART_CACHE_TTL", 300))
+CHART_DAYS = {"1", "7", "30", "90", "365", "max"}
+# Pontos devolvidos por padrão em cada 'days' (LTTB no servidor); ?points=0 devolve a série inteira
+CHART_POINTS = {"1": 288, "7": 336, "30": 360, "90": 360, "365": 365, "max": 500}
+CHART_MAX_POINTS = int(getattr(settings, "COIN_CHART_MAX_POINTS", 2000))
+# Hits servem o corpo já renderizado guardado no cache, sem passar pelo JSONRenderer
+RAW_RESPONSES = bool(getattr(settings, "COIN_CACHE_RAW_RESPONSES", True))
 
 
-def _build_page_url(request, page, per_page, search):
-    base = request.build_absolute_uri().split("?")[0]
-    q = {"page": page, "per_page": per_page}
-    if search:
-        q["search"] = search
-    return f"{base}?{urlencode(q)}"
+# Falhas "tente de novo já já": sem orçamento no rate limiter, outro worker buscando a chave...
+RETRYABLE = (coingecko.UpstreamUnavailable, cache.FillTimeout)
+
+
+def upstream_unavailable(exc):
+    """
+    503 imediato quando a CoinGecko não pode ser consultada (circuit breaker
+    aberto, sem orçamento no rate limiter, fill em andamento em outro worker)
+    e não há nenhum valor em cache para servir, com Retry-After.
+    """
+    resp = response.Response(
+        {"detail": "upstream temporarily unavailable, try again shortly"},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+    retry_after = getattr(exc, "retry_after", None)
+    if retry_after is not None:
+        resp["Retry-After"] = ratelimit.retry_after_header(retry_after)
+    return resp
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == etag for t in if_none_match.split(","))
+
+
+def cached_response(request, entry, state, content_type="application/json", **kwargs):
+    """
+    Response de uma entrada vinda de cache.get_or_fill:
+    - If-None-Match igual ao ETag -> 304 sem corpo;
+    - hit/stale (ou corpo binário, em qualquer estado) -> bytes
+      pré-renderizados direto do cache, com o ETag forte (hash exatamente
+      desses bytes);
+    - miss -> payload recém-buscado (cached=False) pelo DRF. Esse corpo não é
+      o que foi hasheado (e pode ser a API navegável em HTML), então o ETag vai
+      fraco (W/) e com Vary: Accept.
+    """
+    etag = entry.etag
+    if etag_matches(request.META.get("HTTP_IF_NONE_MATCH"), entry.etag):
+        resp = HttpResponseNotModified()
+    elif entry.binary or content_type != "application/json" or (state != cache.MISS and RAW_RESPONSES):
+        resp = HttpResponse(entry.body, content_type=content_type)
+    else:
+        resp = response.Response(entry.value, **kwargs)
+        etag = "W/" + entry.etag
+        patch_vary_headers(resp, ("Accept",))
+    resp["ETag"] = etag
+    stale_warning(resp, state)
+    return resp
+
+
+def stale_warning(resp, state):
+    """
+    Marca respostas que não são frescas: 110 na janela stale (revalidando em
+    background); 110 + 111 quando a revalidação falhou e o valor servido é o
+    último conhecido (CoinGecko fora do ar / circuit breaker aberto).
+    """
+    if state == cache.STALE:
+        resp["Warning"] = '110 - "Response is Stale"'
+    elif state == cache.DEGRADED:
+        resp["Warning"] = '110 - "Response is Stale", 111 - "Revalidation Failed"'
+
+
+def refresher(ns, ttl, parts, args, last_known=False):
+    """Callback que enfileira o refresh em background de uma entrada stale."""
+    return lambda: tasks.refresh_coin_cache.delay(ns, ttl, list(parts), list(args), last_known)
+
+
+def chart_last_known(ns, days, points):
+    # só o gráfico JSON na resolução padrão guarda último valor conhecido
+    return ns == "coins:chart" and points == CHART_POINTS[days]
+
+
+def normalize_days(value):
+    days = (value or "7").lower()
+    # normaliza valores inválidos silenciosamente para "7"
+    return days if days in CHART_DAYS else "7"
+
+
+def normalize_points(value, days):
+    try:
+        points = int(value) if value not in (None, "") else CHART_POINTS[days]
+    except ValueError:
+        points = CHART_POINTS[days]
+    # 0 = sem downsampling; senão entre 10 e o teto configurado
+    return 0 if points <= 0 else max(10, min(points, CHART_MAX_POINTS))
 
 
 class CoinsListView(views.APIView):
     """
     GET /api/coins/?page=1&per_page=20&search=bitcoin
     Lista moedas (CoinGecko /coins/markets), com cache e paginação básica.
+    Páginas dentro do universo aquecido (top COIN_UNIVERSE_SIZE) são fatiadas
+    do snapshot no Redis e 'search' é resolvido por um índice local de
+    prefixos (id/símbolo/nome), ambos sem chamada ao upstream.
     """
     permission_classes = [permissions.AllowAny]
 
@@ -36,44 +131,26 @@ class CoinsListView(views.APIView):
         per_page = max(1, min(per_page, 100))  # limite de segurança
         search = (request.GET.get("search") or "").strip()
 
-        # 1) cache
-        cached = cache.get_json("coins:list", str(page), str(per_page), search)
-        if cached:
-            cached["cached"] = True
-            return response.Response(cached)
-
-        # 2) fetch CoinGecko (nota: o 'search' não é aplicado nativamente em /markets)
-        data = coingecko.list_markets(page=page, per_page=per_page, search=search)
-
-        results = []
-        for c in data:
-            results.append({
-                "id": c.get("id"),
-                "symbol": c.get("symbol"),
-                "name": c.get("name"),
-                "image": c.get("image"),
-                "current_price": c.get("current_price"),
-                "price_change_24h": c.get("price_change_24h"),
-                "price_change_percentage_24h": c.get("price_change_percentage_24h"),
-                "market_cap": c.get("market_cap"),
-                "market_cap_rank": c.get("market_cap_rank"),
-                "total_volume": c.get("total_volume"),
-                "high_24h": c.get("high_24h"),
-                "low_24h": c.get("low_24h"),
-            })
-
-        # CoinGecko não devolve o total. Mantemos um valor simbólico (ou pode ser None).
-        payload = {
-            "count": 100,
-            "next": None if len(data) < per_page else _build_page_url(request, page + 1, per_page, search),
-            "previous": None if page == 1 else _build_page_url(request, page - 1, per_page, search),
-            "results": results,
-            "cached": False,
-            "cached_at": cache.now_iso(),
-        }
-
-        cache.set_json("coins:list", payload, LIST_TTL, str(page), str(per_page), search)
-        return response.Response(payload)
+        base = request.build_absolute_uri().split("?")[0]
+        if search:
+            # busca local no universo aquecido: não gera chave de cache nem chamada upstream
+            payload = payloads.search_list_payload(page, per_page, search, base)
+            if payload is not None:
+                return response.Response(payload)
+
+        # a versão do universo na chave faz cada refresh dele gerar páginas novas
+        parts = (str(page), str(per_page), search, universe.version())
+        args = (page, per_page, search, base)
+
+        # cache SWR com single-flight: num miss só um worker vai à CoinGecko
+        try:
+            entry, state = cache.get_or_fill(
+                "coins:list", LIST_TTL, lambda: payloads.fetch_list(*args), *parts,
+                refresh=refresher("coins:list", LIST_TTL, parts, args),
+            )
+        except RETRYABLE as exc:
+            return upstream_unavailable(exc)
+        return cached_response(request, entry, state)
 
 
 class CoinDetailView(views.APIView):
@@ -84,91 +161,56 @@ class CoinDetailView(views.APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, coin_id):
-        # 1) cache
-        cached = cache.get_json("coins:detail", coin_id)
-        if cached:
-            cached["cached"] = True
-            return response.Response(cached)
-
-        # 2) fetch CoinGecko
         try:
-            d = coingecko.coin_detail(coin_id)
+            entry, state = cache.get_or_fill(
+                "coins:detail", DETAIL_TTL, lambda: payloads.fetch_detail(coin_id), coin_id,
+                refresh=refresher("coins:detail", DETAIL_TTL, [coin_id], [coin_id], True), last_known=True,
+            )
+        except RETRYABLE as exc:
+            return upstream_unavailable(exc)
         except Exception:
             return response.Response(
                 {"detail": f"coin '{coin_id}' not found or upstream error"},
                 status=status.HTTP_404_NOT_FOUND
             )
-
-        md = d.get("market_data") or {}
-        out = {
-            "id": d.get("id"),
-            "symbol": d.get("symbol"),
-            "name": d.get("name"),
-            "description": (d.get("description") or {}).get("en", ""),
-            "image": (d.get("image") or {}).get("large")
-                     or (d.get("image") or {}).get("small")
-                     or (d.get("image") or {}).get("thumb"),
-            "current_price": (md.get("current_price") or {}).get("usd"),
-            "market_cap": (md.get("market_cap") or {}).get("usd"),
-            "market_cap_rank": md.get("market_cap_rank") or d.get("market_cap_rank"),
-            "total_volume": (md.get("total_volume") or {}).get("usd"),
-            "high_24h": (md.get("high_24h") or {}).get("usd"),
-            "low_24h": (md.get("low_24h") or {}).get("usd"),
-            # price_change_24h: valor absoluto em USD (usamos em_currency se existir)
-            "price_change_24h": (md.get("price_change_24h_in_currency") or {}).get("usd", md.get("price_change_24h")),
-            "price_change_percentage_24h": md.get("price_change_percentage_24h"),
-            "circulating_supply": md.get("circulating_supply"),
-            "total_supply": md.get("total_supply"),
-            "max_supply": md.get("max_supply"),
-            "ath": (md.get("ath") or {}).get("usd"),
-            "ath_date": (md.get("ath_date") or {}).get("usd"),
-            "links": {
-                "homepage": ((d.get("links") or {}).get("homepage") or [""])[0],
-                "blockchain_site": ((d.get("links") or {}).get("blockchain_site") or [""])[0],
-                "official_forum": ((d.get("links") or {}).get("official_forum_url") or [None])[0],
-            },
-            "cached": False,
-            "cached_at": cache.now_iso(),
-        }
-
-        cache.set_json("coins:detail", out, DETAIL_TTL, coin_id)
-        return response.Response(out)
+        return cached_response(request, entry, state)
 
 
 class CoinChartView(views.APIView):
     """
-    GET /api/coins/{coin_id}/chart/?days=7
+    GET /api/coins/{coin_id}/chart/?days=7&points=300
     Retorna série histórica: {"prices": [[timestamp_ms, price], ...], "cached": bool}
+    reduzida a 'points' pontos por LTTB (padrão por 'days'; points=0 = série inteira).
+    Com ?format=bin (ou Accept: application/vnd.cryptotracker.series) a série
+    sai empacotada (services/packed.py), como está guardada no Redis.
     """
     permission_classes = [permissions.AllowAny]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, PackedSeriesRenderer]
 
     def get(self, request, coin_id: str):
-        days = (request.query_params.get("days") or "7").lower()
-        allowed = {"1", "7", "30", "90", "365", "max"}
-        if days not in allowed:
-            # normaliza valores inválidos silenciosamente para "7"
-            days = "7"
-
-        # 1) cache
-        cached = cache.get_json("coins:chart", coin_id, days)
-        if cached:
-            cached["cached"] = True
-            return response.Response(cached, status=status.HTTP_200_OK)
-
-        # 2) fetch CoinGecko
+        days = normalize_days(request.query_params.get("days"))
+        points = normalize_points(request.query_params.get("points"), days)
+        # cada resolução é uma entrada própria no cache
+        parts, args = (coin_id, days, str(points)), (coin_id, days, points)
+        binary = request.accepted_renderer.format == packed.FORMAT
+        ns = "coins:chart:bin" if binary else "coins:chart"
+
+        last_known = chart_last_known(ns, days, points)
         try:
-            raw = coingecko.coin_chart(coin_id, days)
+            entry, state = cache.get_or_fill(
+                ns, CHART_TTL, lambda: payloads.FETCHERS[ns](*args), *parts,
+                refresh=refresher(ns, CHART_TTL, parts, args, last_known), last_known=last_known,
+            )
+        except RETRYABLE as exc:
+            return upstream_unavailable(exc)
         except Exception:
             return response.Response(
                 {"detail": f"coin '{coin_id}' not found or upstream error"},
                 status=status.HTTP_404_NOT_FOUND
             )
-
-        # 3) resposta + cache
-        payload = {
-            "prices": raw.get("prices", []),
-            "cached": False,
-            "cached_at": cache.now_iso(),
-        }
-        cache.set_json("coins:chart", payload, CHART_TTL, coin_id, days)
-        return response.Response(payload, status=status.HTTP_200_OK)
+        resp = cached_response(
+            request, entry, state, content_type=packed.MEDIA_TYPE if binary else "application/json",
+            status=status.HTTP_200_OK,
+        )
+        patch_vary_headers(resp, ("Accept",))
+        return resp
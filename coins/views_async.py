@@ -0,0 +1,133 @@
+import asyncio
+
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_GET
+
+from .services import coingecko_async, cache, ratelimit, series, packed, prices, stream
+from .services.payloads import detail_payload, chart_payload
+from .views import DETAIL_TTL, CHART_TTL, RAW_RESPONSES, RETRYABLE, normalize_days, normalize_points, refresher, etag_matches, stale_warning, chart_last_known
+
+# Versões async (servidas via core/asgi.py) dos endpoints que dependem da
+# CoinGecko: a espera pelo upstream não prende uma thread do worker.
+
+
+def upstream_unavailable(exc):
+    resp = JsonResponse({"detail": "upstream temporarily unavailable, try again shortly"}, status=503)
+    retry_after = getattr(exc, "retry_after", None)
+    if retry_after is not None:
+        resp["Retry-After"] = ratelimit.retry_after_header(retry_after)
+    return resp
+
+
+def _cached_response(request, entry, state, content_type="application/json"):
+    etag = entry.etag
+    if etag_matches(request.headers.get("If-None-Match"), entry.etag):
+        resp = HttpResponseNotModified()
+    elif entry.binary or content_type != "application/json" or (state != cache.MISS and RAW_RESPONSES):
+        resp = HttpResponse(entry.body, content_type=content_type)
+    else:
+        # corpo diferente dos bytes hasheados (cached=False): ETag fraco
+        resp = JsonResponse(entry.value)
+        etag = "W/" + entry.etag
+    resp["ETag"] = etag
+    stale_warning(resp, state)
+    return resp
+
+
+def _wants_packed(request):
+    # mesma negociação do DRF no CoinChartView: ?format=bin ou Accept
+    if "format" in request.GET:
+        return request.GET["format"] == packed.FORMAT
+    return packed.MEDIA_TYPE in request.headers.get("Accept", "")
+
+
+def _not_found(coin_id):
+    return JsonResponse({"detail": f"coin '{coin_id}' not found or upstream error"}, status=404)
+
+
+@require_GET
+async def coin_detail(request, coin_id):
+    """
+    GET /api/async/coins/{coin_id}/
+    Mesmo payload (e mesmo cache) do CoinDetailView.
+    """
+    async def fetch():
+        return detail_payload(await coingecko_async.coin_detail(coin_id))
+
+    try:
+        entry, state = await cache.aget_or_fill(
+            "coins:detail", DETAIL_TTL, fetch, coin_id,
+            refresh=refresher("coins:detail", DETAIL_TTL, [coin_id], [coin_id], True), last_known=True,
+        )
+    except RETRYABLE as exc:
+        return upstream_unavailable(exc)
+    except Exception:
+        return _not_found(coin_id)
+    return _cached_response(request, entry, state)
+
+
+@require_GET
+async def coin_chart(request, coin_id):
+    """
+    GET /api/async/coins/{coin_id}/chart/?days=7&points=300
+    Mesmo payload (e mesmo cache) do CoinChartView, inclusive o formato binário.
+    """
+    days = normalize_days(request.GET.get("days"))
+    points = normalize_points(request.GET.get("points"), days)
+    parts, args = (coin_id, days, str(points)), (coin_id, days, points)
+    binary = _wants_packed(request)
+    ns = "coins:chart:bin" if binary else "coins:chart"
+
+    async def fetch():
+        payload = chart_payload(await series.aget_range(coin_id, days), points)
+        return packed.pack(payload["prices"]) if binary else payload
+
+    last_known = chart_last_known(ns, days, points)
+    try:
+        entry, state = await cache.aget_or_fill(
+            ns, CHART_TTL, fetch, *parts,
+            refresh=refresher(ns, CHART_TTL, parts, args, last_known), last_known=last_known,
+        )
+    except RETRYABLE as exc:
+        return upstream_unavailable(exc)
+    except Exception:
+        return _not_found(coin_id)
+    resp = _cached_response(request, entry, state, packed.MEDIA_TYPE if binary else "application/json")
+    patch_vary_headers(resp, ("Accept",))
+    return resp
+
+
+@require_GET
+async def price_stream(request):
+    """
+    GET /api/stream/prices/?coins=bitcoin,ethereum
+    Server-Sent Events: um evento "snapshot" com o preço atual das moedas
+    pedidas e depois um evento "prices" ({coin_id: {price, change_24h}}) a
+    cada tick do update_coin_prices_cache que muda alguma delas.
+    """
+    coins = sorted({c.strip().lower() for c in request.GET.get("coins", "").split(",") if c.strip()})
+    if not coins:
+        return JsonResponse({"detail": "informe ?coins=id1,id2"}, status=400)
+    if len(coins) > stream.MAX_COINS:
+        return JsonResponse({"detail": f"no máximo {stream.MAX_COINS} moedas por conexão"}, status=400)
+
+    async def events():
+        hub = stream.get_hub()
+        sub = hub.subscribe(coins)
+        try:
+            snap = await asyncio.to_thread(prices.read_snapshot, coins)
+            yield stream.sse("snapshot", {
+                cid: {"price": e.get("price"), "change_24h": e.get("change_24h")} for cid, e in snap.items()
+            })
+            while True:
+                changes = await sub.next(stream.HEARTBEAT)
+                yield stream.sse("prices", changes) if changes else b": keep-alive\n\n"
+        finally:
+            # cliente desconectou (o ASGI handler cancela o gerador)
+            hub.unsubscribe(sub)
+
+    resp = StreamingHttpResponse(events(), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"  # nginx: não bufferizar o stream
+    return resp
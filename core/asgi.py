@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# o loop do servidor ASGI vive o processo todo: coingecko_async compartilha um client por worker
+os.environ.setdefault('SERVER_MODE', 'asgi')
 
 application = get_asgi_application()
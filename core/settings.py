@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 from datetime import timedelta
 
@@ -45,6 +46,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # estáticos (admin, browsable API) servidos pelo próprio gunicorn, comprimidos e com cache longo
+    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -59,6 +62,14 @@ ASGI_APPLICATION = "core.asgi.application" if (BASE_DIR / "core/asgi.py").exists
 
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "static"
+# Fora do DEBUG o collectstatic gera nomes com hash + .gz/.br (cache "forever" no WhiteNoise)
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage" if DEBUG
+        else "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
 
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -68,6 +79,8 @@ REST_FRAMEWORK = {
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
+# Tamanho padrão das páginas (cursor) de favoritos, holdings, alertas e notificações
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "50"))
 
 SPECTACULAR_SETTINGS = {
     "TITLE": "CryptoTracker API",
@@ -92,6 +105,32 @@ DATABASES = {
     }
 }
 
+# --------- DB: conexões persistentes (por tipo de processo) ----------
+# Sem CONN_MAX_AGE cada request abria (handshake + auth) e fechava uma conexão.
+# Agora cada thread reaproveita a sua por até CONN_MAX_AGE s, testada antes de
+# reusar (CONN_HEALTH_CHECKS). O papel do processo vem de DB_ROLE; sem ele,
+# o binário celery vira "worker" e o resto "web" (o gunicorn.conf.py define
+# "asgi" no modo asgi):
+# - web: gthread, uma conexão por thread -> workers x threads conexões;
+# - worker: Celery (o fixup do Celery fecha as vencidas antes/depois de cada task);
+# - asgi: 0 (recomendação do Django sob ASGI) — use um pooler na frente.
+# DB_POOLER=pgbouncer: DATABASE_URL aponta para um PgBouncer em transaction
+# mode; cursores server-side (iterator()) não sobrevivem a ele e são desligados.
+DB_ROLE = os.getenv("DB_ROLE") or ("worker" if "celery" in Path(sys.argv[0]).name else "web")
+DB_POOLER = os.getenv("DB_POOLER", "")
+DB_CONN_MAX_AGE = {
+    "web": int(os.getenv("DB_CONN_MAX_AGE_WEB", "60")),
+    "worker": int(os.getenv("DB_CONN_MAX_AGE_WORKER", "600")),
+    "asgi": 0,
+}
+DATABASES["default"].update({
+    "CONN_MAX_AGE": DB_CONN_MAX_AGE.get(DB_ROLE, 0),
+    "CONN_HEALTH_CHECKS": True,
+    "DISABLE_SERVER_SIDE_CURSORS": DB_POOLER == "pgbouncer",
+})
+# soma às OPTIONS já definidas (sslmode etc.) em vez de substituí-las
+DATABASES["default"].setdefault("OPTIONS", {})["connect_timeout"] = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+
 # Redis / Celery
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", os.getenv("REDIS_URL", "redis://redis:6379/0"))
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", os.getenv("REDIS_URL", "redis://redis:6379/0"))
@@ -109,6 +148,10 @@ CELERY_BEAT_SCHEDULE = {
         "task": "portfolio.tasks.check_price_alerts",
         "schedule": 300.0,  # a cada 5 min
     },
+    "refresh-coin-catalog": {
+        "task": "coins.tasks.refresh_coin_catalog",
+        "schedule": crontab(minute=17, hour="*/6"),  # a cada 6 h
+    },
 }
 
 # JWT
@@ -129,8 +172,60 @@ COINGECKO_KEY_IN_QUERY = os.getenv("COINGECKO_KEY_IN_QUERY", "0")
 COINGECKO_TIMEOUT = os.getenv("COINGECKO_TIMEOUT", "10")        # segundos
 COINGECKO_MAX_RETRIES = os.getenv("COINGECKO_MAX_RETRIES", "3")
 COINGECKO_BACKOFF_BASE = os.getenv("COINGECKO_BACKOFF_BASE", "0.7")
+COINGECKO_POOL_SIZE = os.getenv("COINGECKO_POOL_SIZE", "10")      # conexões keep-alive por processo
+COINGECKO_ASYNC_CONCURRENCY = os.getenv("COINGECKO_ASYNC_CONCURRENCY", "100")  # requests simultâneas (cliente async)
+COINGECKO_FANOUT_WORKERS = os.getenv("COINGECKO_FANOUT_WORKERS", COINGECKO_POOL_SIZE)  # threads do fan-out paralelo
+COINGECKO_FANOUT_DEADLINE = os.getenv("COINGECKO_FANOUT_DEADLINE", "8")  # s; lotes atrasados ficam de fora
+
+# Token bucket global (Redis) da cota da CoinGecko, compartilhado por web + Celery
+COINGECKO_RATE_LIMIT_PER_MIN = os.getenv("COINGECKO_RATE_LIMIT_PER_MIN", "30")
+COINGECKO_RATE_LIMIT_BURST = os.getenv("COINGECKO_RATE_LIMIT_BURST", COINGECKO_RATE_LIMIT_PER_MIN)
+COINGECKO_RATE_LIMIT_RESERVE = os.getenv("COINGECKO_RATE_LIMIT_RESERVE", "0.3")  # fração só p/ tráfego interativo
+
+# Circuit breaker (estado no Redis, compartilhado): N falhas seguidas (rede/5xx)
+# abrem o circuito; aberto, toda chamada falha na hora por COOLDOWN s
+COINGECKO_BREAKER_FAILURES = os.getenv("COINGECKO_BREAKER_FAILURES", "5")
+COINGECKO_BREAKER_COOLDOWN = os.getenv("COINGECKO_BREAKER_COOLDOWN", "30")  # segundos
 
 # TTLs de cache (se quiser usar nas views)
 COIN_LIST_CACHE_TTL = int(os.getenv("COIN_LIST_CACHE_TTL", "120"))
 COIN_DETAIL_CACHE_TTL = int(os.getenv("COIN_DETAIL_CACHE_TTL", "300"))
-COIN_CHART_CACHE_TTL = int(os.getenv("COIN_CHART_CACHE_TTL", "300"))
\ No newline at end of file
+COIN_CHART_CACHE_TTL = int(os.getenv("COIN_CHART_CACHE_TTL", "300"))
+# Depois do TTL acima a entrada vira "stale": ainda é servida por mais
+# CACHE_STALE_TTL segundos enquanto uma task Celery a atualiza em background.
+CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", "600"))
+# Detalhe e gráfico padrão ficam mais CACHE_DEGRADED_TTL s guardados como último
+# valor conhecido, servido (Warning 111) só quando a busca falha — CoinGecko
+# fora do ar / breaker aberto. Variantes de points/formato não são guardadas.
+CACHE_DEGRADED_TTL = int(os.getenv("CACHE_DEGRADED_TTL", "21600"))
+# L1 em memória (por processo) na frente do Redis; invalidado via pub/sub
+CACHE_L1_SIZE = int(os.getenv("CACHE_L1_SIZE", "512"))     # entradas
+CACHE_L1_TTL = float(os.getenv("CACHE_L1_TTL", "1.0"))     # segundos
+# Hits de /api/coins/* saem como bytes pré-renderizados (com ETag/304); "0" volta ao JSONRenderer
+COIN_CACHE_RAW_RESPONSES = os.getenv("COIN_CACHE_RAW_RESPONSES", "1") == "1"
+
+# Universo de mercado aquecido pelo update_coin_prices_cache (top N por market cap,
+# em páginas de 250); o /api/coins/ fatia esse snapshot sem chamar a CoinGecko
+COIN_UNIVERSE_SIZE = int(os.getenv("COIN_UNIVERSE_SIZE", "2500"))
+# Segundos sem refresh até o universo expirar no Redis (aí as páginas voltam à CoinGecko)
+COIN_UNIVERSE_MAX_AGE = int(os.getenv("COIN_UNIVERSE_MAX_AGE", "3600"))
+
+# Snapshot de preços compartilhado (hash Redis mantido pelo update_coin_prices_cache)
+PRICE_SNAPSHOT_MAX_AGE = int(os.getenv("PRICE_SNAPSHOT_MAX_AGE", "300"))
+
+# Série histórica local dos gráficos (coins/services/series.py): segundos até
+# buscar de novo a janela recente (days=1) e anexá-la à série
+COIN_SERIES_FRESHNESS = int(os.getenv("COIN_SERIES_FRESHNESS", "120"))
+# Teto do ?points= do /chart/ (downsampling LTTB; o padrão depende de 'days')
+COIN_CHART_MAX_POINTS = int(os.getenv("COIN_CHART_MAX_POINTS", "2000"))
+
+# Valuation materializada do GET /api/portfolio/ (portfolio/services/valuation.py):
+# reconstruída quando as holdings mudam, reavaliada a cada tick de preços
+PORTFOLIO_VALUATION_TTL = int(os.getenv("PORTFOLIO_VALUATION_TTL", "900"))
+
+# Streams SSE (/api/stream/*, só sob ASGI)
+STREAM_MAX_COINS = int(os.getenv("STREAM_MAX_COINS", "100"))     # moedas por conexão
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "15"))    # s entre keep-alives
+# Buffer por usuário (Redis stream) para retomar /api/stream/notifications/ pelo Last-Event-ID
+NOTIFY_STREAM_MAXLEN = int(os.getenv("NOTIFY_STREAM_MAXLEN", "500"))
+NOTIFY_STREAM_TTL = int(os.getenv("NOTIFY_STREAM_TTL", str(7 * 24 * 3600)))
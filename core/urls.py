@@ -3,7 +3,9 @@ from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
 from utils.health_check import health
-from core.views import TriggerTaskView
+from core.views import TriggerTaskView, asgi_only
+from coins import views_async as coins_async
+from portfolio import views_async as portfolio_async
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -22,4 +24,13 @@ urlpatterns = [
     path("api/auth/", include("authentication.urls")),
     path("api/coins/", include("coins.urls")),
     path("api/portfolio/", include("portfolio.urls")),
+
+    # versões async dos endpoints com fan-out para a CoinGecko e streams SSE
+    # (deltas de preço e notificações via pub/sub do Redis): só no servidor
+    # ASGI (serviço backend_asgi); sob WSGI respondem 404
+    path("api/async/coins/<str:coin_id>/", asgi_only(coins_async.coin_detail)),
+    path("api/async/coins/<str:coin_id>/chart/", asgi_only(coins_async.coin_chart)),
+    path("api/async/portfolio/", asgi_only(portfolio_async.portfolio)),
+    path("api/stream/prices/", asgi_only(coins_async.price_stream)),
+    path("api/stream/notifications/", asgi_only(portfolio_async.notification_stream)),
 ]
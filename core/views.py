@@ -1,6 +1,25 @@
+import functools
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse
 from rest_framework import views, permissions, response, status
 from coins.tasks import update_coin_prices_cache
 
+
+def asgi_only(view):
+    """
+    Rotas async/ e stream/ só existem no servidor ASGI (SERVER_MODE=asgi).
+    Sob WSGI o Django consome um iterador async inteiro antes de mandar o
+    primeiro byte: um stream SSE prenderia uma thread do gthread para sempre.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({"detail": "available only on the ASGI server"}, status=404)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
 class TriggerTaskView(views.APIView):
     """
     Endpoint para disparar manualmente uma task Celery.
@@ -3,6 +3,9 @@ set -e
 
 python manage.py migrate --noinput
 python manage.py collectstatic --noinput || true
+# primeiro deploy: o Beat só recarrega o catálogo a cada 6 h; sem ele todo POST
+# de favorito/holding/alerta iria ao /coins/{id}
+python manage.py bootstrap_catalog || true
 
 # cria superuser padrão (opcional)
 echo "from django.contrib.auth import get_user_model; User=get_user_model(); \
@@ -10,4 +13,8 @@ echo "from django.contrib.auth import get_user_model; User=get_user_model(); \
       User.objects.create_superuser('admin','admin@example.com','admin123')" \
       | python manage.py shell || true
 
-python manage.py runserver 0.0.0.0:3000
+# SERVER_MODE=wsgi (padrão) | asgi -> gunicorn (ver gunicorn.conf.py); dev -> runserver
+if [ "${SERVER_MODE:-wsgi}" = "dev" ]; then
+  exec python manage.py runserver 0.0.0.0:${PORT:-3000}
+fi
+exec gunicorn -c gunicorn.conf.py
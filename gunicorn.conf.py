@@ -0,0 +1,67 @@
+"""
+Configuração do gunicorn (produção). Uso: gunicorn -c gunicorn.conf.py
+
+SERVER_MODE escolhe a aplicação:
+- wsgi (padrão): core.wsgi com workers gthread — as views DRF síncronas
+  (a maior parte da API) rodam em paralelo nas threads de cada worker;
+- asgi: core.asgi com workers do uvicorn — para as rotas async/ e os streams
+  SSE (stream/), que não prendem uma thread por conexão.
+Quantidade de workers derivada dos cores; tudo sobrescrevível por env.
+"""
+import os
+import multiprocessing
+
+MODE = os.getenv("SERVER_MODE", "wsgi")
+CPUS = multiprocessing.cpu_count()
+# política de conexões do banco por tipo de processo (core/settings.py)
+os.environ.setdefault("DB_ROLE", "asgi" if MODE == "asgi" else "web")
+
+if MODE == "asgi":
+    wsgi_app = "core.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+    # um event loop por core já satura a CPU; mais workers só disputam os cores
+    workers = int(os.getenv("WEB_CONCURRENCY", str(CPUS)))
+else:
+    wsgi_app = "core.wsgi:application"
+    worker_class = "gthread"
+    # 2 x cores + 1 processos (regra do gunicorn) com threads para a espera de I/O (Redis/DB/CoinGecko)
+    workers = int(os.getenv("WEB_CONCURRENCY", str(CPUS * 2 + 1)))
+    threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '3000')}"
+
+# Carrega o Django uma vez no master e faz fork dos workers (menos memória, boot
+# mais rápido). Session HTTP, pool de threads do fan-out e listener do L1 já
+# são recriados por PID; conexões de banco são fechadas no post_fork.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+# Recicla cada worker depois de N requests (com jitter para não reciclarem juntos)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+# só confia em X-Forwarded-* vindos do proxy na frente
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+def post_fork(server, worker):
+    # com preload_app o master pode ter aberto conexões (ex.: checks no boot);
+    # o worker não pode herdar o socket do pai
+    from django.db import connections
+
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    # índice de busca do /api/coins/?search= montado já no boot (em background),
+    # não na primeira busca
+    if MODE != "asgi":
+        from coins.services import search
+
+        search.warm()
@@ -0,0 +1,80 @@
+import time
+import statistics
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from portfolio.models import PortfolioHolding
+
+BENCH_USERNAME = "bench-db"
+
+
+class Command(BaseCommand):
+    help = (
+        "Custo de conexão por request: simula N requests (request_started -> query -> "
+        "request_finished, o mesmo ciclo do handler do Django) com CONN_MAX_AGE=0 "
+        "(conexão nova a cada request) e com conexões persistentes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--max-age", type=int, default=60, help="CONN_MAX_AGE do caso persistente")
+        parser.add_argument("--no-health-checks", action="store_true", help="desliga CONN_HEALTH_CHECKS no caso persistente")
+
+    def _run(self, n, max_age, health_checks, query):
+        connection.close()
+        connection.settings_dict["CONN_MAX_AGE"] = max_age
+        connection.settings_dict["CONN_HEALTH_CHECKS"] = health_checks
+        connects = 0
+
+        def count(sender, **kwargs):
+            nonlocal connects
+            connects += 1
+
+        connection_created.connect(count)
+        samples = []
+        try:
+            for _ in range(n):
+                t0 = time.perf_counter()
+                request_started.send(sender=self.__class__)
+                query()
+                request_finished.send(sender=self.__class__)
+                samples.append((time.perf_counter() - t0) * 1e6)
+        finally:
+            connection_created.disconnect(count)
+            connection.close()
+        samples.sort()
+        return statistics.median(samples), samples[int(len(samples) * 0.99) - 1], connects
+
+    def _select_one(self):
+        with connection.cursor() as cur:
+            cur.execute("SELECT 1")
+
+    def handle(self, *args, **opts):
+        # email é único (USERNAME_FIELD): cada bench usa o seu
+        user, _ = get_user_model().objects.get_or_create(
+            username=BENCH_USERNAME, defaults={"email": f"{BENCH_USERNAME}@bench.invalid"},
+        )
+        original = dict(connection.settings_dict)
+        queries = {
+            "SELECT 1": self._select_one,
+            "holdings": lambda: list(PortfolioHolding.objects.filter(user=user)[:50]),
+        }
+        health = not opts["no_health_checks"]
+        n = opts["requests"]
+        self.stdout.write(f"{n} requests simuladas, banco {original['HOST']}:{original['PORT']}")
+        self.stdout.write(f"{'query':<10} {'conexões':<22} {'p50 µs':>9} {'p99 µs':>9} {'connects':>9}")
+        try:
+            for name, query in queries.items():
+                fresh = self._run(n, 0, False, query)
+                kept = self._run(n, opts["max_age"], health, query)
+                label = f"persistente ({opts['max_age']}s{', hc' if health else ''})"
+                for mode, (p50, p99, connects) in (("CONN_MAX_AGE=0", fresh), (label, kept)):
+                    self.stdout.write(f"{name:<10} {mode:<22} {p50:>9.0f} {p99:>9.0f} {connects:>9}")
+                self.stdout.write(f"{'':<10} {'overhead removido':<22} {fresh[0] - kept[0]:>9.0f} µs/request (p50)")
+        finally:
+            connection.settings_dict.update(original)
+            user.delete()
@@ -0,0 +1,167 @@
+import os
+import time
+import asyncio
+import signal
+import statistics
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+import httpx
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from portfolio.models import PortfolioHolding
+
+BENCH_USERNAME = "bench-http"
+BENCH_COINS = [
+    "bitcoin", "ethereum", "tether", "binancecoin", "solana", "ripple", "usd-coin", "cardano",
+    "dogecoin", "tron", "avalanche-2", "chainlink", "polkadot", "litecoin", "uniswap",
+]
+READY_TIMEOUT = 30.0
+
+
+def _drive(base, path, headers, duration, conns):
+    """
+    Um processo gerador de carga: 'conns' conexões keep-alive batendo em
+    'path' até acabar o tempo. Retorna (respostas 2xx/304, erros, latências ms).
+    """
+    async def run():
+        ok, errors, lat = 0, 0, []
+        deadline = time.perf_counter() + duration
+        limits = httpx.Limits(max_connections=conns, max_keepalive_connections=conns)
+        async with httpx.AsyncClient(base_url=base, headers=headers, limits=limits, timeout=30) as client:
+            async def worker():
+                nonlocal ok, errors
+                while time.perf_counter() < deadline:
+                    t0 = time.perf_counter()
+                    try:
+                        resp = await client.get(path)
+                        good = resp.status_code < 400
+                    except httpx.HTTPError:
+                        good = False
+                    lat.append((time.perf_counter() - t0) * 1000)
+                    if good:
+                        ok += 1
+                    else:
+                        errors += 1
+            await asyncio.gather(*(worker() for _ in range(conns)))
+        return ok, errors, lat
+
+    return asyncio.run(run())
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga HTTP: sobe o gunicorn (gunicorn.conf.py) com 1..N workers e mede "
+        "req/s e latência de /api/coins/ e /api/portfolio/ em cada configuração."
+    )
+
+    def add_arguments(self, parser):
+        cpus = os.cpu_count() or 1
+        default_workers = ",".join(str(n) for n in sorted({1, 2, 4, 8, cpus, cpus * 2 + 1}) if n <= cpus * 2 + 1)
+        parser.add_argument("--workers", default=default_workers, help="quantidades de workers, separadas por vírgula")
+        parser.add_argument("--mode", choices=["wsgi", "asgi"], default="wsgi", help="SERVER_MODE do gunicorn")
+        parser.add_argument("--paths", default="/api/coins/,/api/portfolio/")
+        parser.add_argument("--duration", type=float, default=10.0, help="segundos de carga por rota")
+        parser.add_argument("--concurrency", type=int, default=64, help="conexões simultâneas no total")
+        parser.add_argument("--procs", type=int, default=max(1, cpus // 2),
+                            help="processos geradores de carga (um só event loop vira o gargalo)")
+        parser.add_argument("--port", type=int, default=3100)
+        parser.add_argument("--url", help="mede um servidor já rodando (ex.: http://127.0.0.1:3000) em vez de subir o gunicorn")
+        parser.add_argument("--holdings", type=int, default=10, help="holdings do usuário de teste")
+        parser.add_argument("--cleanup", action="store_true", help="apaga o usuário de teste no fim")
+
+    def _bench_user(self, holdings):
+        # email é único (USERNAME_FIELD): cada bench usa o seu
+        user, _ = get_user_model().objects.get_or_create(
+            username=BENCH_USERNAME, defaults={"email": f"{BENCH_USERNAME}@bench.invalid"},
+        )
+        have = PortfolioHolding.objects.filter(user=user).count()
+        PortfolioHolding.objects.bulk_create([
+            PortfolioHolding(user=user, coin_id=cid, coin_name=cid, coin_symbol=cid[:5], coin_image="",
+                             amount=Decimal("1.5"), purchase_price_usd=Decimal("100"), purchase_date=date.today())
+            for cid in (BENCH_COINS * (holdings // len(BENCH_COINS) + 1))[have:holdings]
+        ])
+        return user
+
+    def _start_server(self, mode, workers, port):
+        env = {
+            **os.environ,
+            "SERVER_MODE": mode, "WEB_CONCURRENCY": str(workers),
+            "HOST": "127.0.0.1", "PORT": str(port), "GUNICORN_ACCESSLOG": "",
+        }
+        proc = subprocess.Popen(
+            ["gunicorn", "-c", "gunicorn.conf.py"], cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        base = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + READY_TIMEOUT
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise CommandError(f"gunicorn saiu com código {proc.returncode}")
+            try:
+                httpx.get(base + "/api/health/", timeout=1)
+                return proc, base
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        proc.kill()
+        raise CommandError(f"gunicorn não respondeu em {READY_TIMEOUT:.0f}s")
+
+    def _stop_server(self, proc):
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    def _measure(self, pool, base, path, headers, opts):
+        # aquece caches (SWR, valuation) antes de medir
+        for _ in range(3):
+            httpx.get(base + path, headers=headers, timeout=30)
+        procs = opts["procs"]
+        conns = max(1, opts["concurrency"] // procs)
+        futures = [pool.submit(_drive, base, path, headers, opts["duration"], conns) for _ in range(procs)]
+        results = [f.result() for f in futures]
+        ok = sum(r[0] for r in results)
+        errors = sum(r[1] for r in results)
+        lat = sorted(x for r in results for x in r[2])
+        p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))] if lat else 0.0
+        return ok / opts["duration"], statistics.median(lat) if lat else 0.0, p99, errors
+
+    def handle(self, *args, **opts):
+        user = self._bench_user(opts["holdings"])
+        headers = {"Authorization": f"Bearer {RefreshToken.for_user(user).access_token}"}
+        paths = [p.strip() for p in opts["paths"].split(",") if p.strip()]
+        runs = [None] if opts["url"] else [int(n) for n in opts["workers"].split(",")]
+
+        self.stdout.write(
+            f"modo {opts['mode']}, {os.cpu_count()} cores, {opts['concurrency']} conexões "
+            f"em {opts['procs']} processo(s), {opts['duration']:.0f}s por rota"
+        )
+        self.stdout.write(f"{'workers':>8} {'rota':<18} {'req/s':>9} {'x':>6} {'p50 ms':>8} {'p99 ms':>8} {'erros':>6}")
+        baseline = {}
+        with ProcessPoolExecutor(max_workers=opts["procs"]) as pool:
+            for workers in runs:
+                proc = None
+                if workers is None:
+                    base = opts["url"].rstrip("/")
+                else:
+                    proc, base = self._start_server(opts["mode"], workers, opts["port"])
+                try:
+                    for path in paths:
+                        rps, p50, p99, errors = self._measure(pool, base, path, headers, opts)
+                        first = baseline.setdefault(path, rps)
+                        scale = rps / first if first else 0.0
+                        self.stdout.write(
+                            f"{workers or '-':>8} {path:<18} {rps:>9.0f} {scale:>6.2f} {p50:>8.2f} {p99:>8.2f} {errors:>6}"
+                        )
+                finally:
+                    if proc is not None:
+                        self._stop_server(proc)
+
+        if opts["cleanup"]:
+            user.delete()
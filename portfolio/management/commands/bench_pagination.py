@@ -0,0 +1,108 @@
+import time
+import statistics
+from datetime import timedelta
+from urllib.parse import parse_qs, urlparse
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.pagination import Cursor
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from portfolio.models import Notification
+from portfolio.pagination import CreatedAtCursorPagination
+
+SEED_BATCH = 10_000
+UPDATE_BATCH = 1000
+BENCH_USERNAME = "bench-pagination"
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o tempo de uma página de notificações (cursor/keyset vs LIMIT/OFFSET) "
+        "em várias profundidades, com --count notificações para um usuário de teste."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=1_000_000)
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--depths", default="0,1000,10000,100000,500000,990000")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--explain", action="store_true", help="mostra o plano da página mais profunda")
+        parser.add_argument("--cleanup", action="store_true", help="apaga o usuário de teste e as notificações no fim")
+
+    def _seed(self, user, missing):
+        # timestamps distintos e crescentes: o bulk_create grava "agora" em todas
+        # (auto_now_add), então o created_at de cada lote é reescrito pelo
+        # bulk_update, que não passa pelo pre_save do campo
+        start = timezone.now() - timedelta(seconds=missing)
+        for offset in range(0, missing, SEED_BATCH):
+            rows = Notification.objects.bulk_create([
+                Notification(user=user, type="bench", title="bench", message="bench", data={})
+                for _ in range(min(SEED_BATCH, missing - offset))
+            ])
+            for i, row in enumerate(rows):
+                row.created_at = start + timedelta(seconds=offset + i)
+            Notification.objects.bulk_update(rows, ["created_at"], batch_size=UPDATE_BATCH)
+            self.stdout.write(f"\r  seed {offset + len(rows):>9}/{missing}", ending="")
+        self.stdout.write("")
+
+    def _timed(self, fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(samples)
+
+    def handle(self, *args, **opts):
+        # email é único (USERNAME_FIELD): cada bench usa o seu
+        user, _ = get_user_model().objects.get_or_create(
+            username=BENCH_USERNAME, defaults={"email": f"{BENCH_USERNAME}@bench.invalid"},
+        )
+        qs = Notification.objects.filter(user=user)
+        have = qs.count()
+        if have < opts["count"]:
+            self.stdout.write(f"criando {opts['count'] - have} notificações para {BENCH_USERNAME}...")
+            self._seed(user, opts["count"] - have)
+            total = opts["count"]
+        else:
+            total = have
+
+        page_size = opts["page_size"]
+        ordered = qs.order_by("-created_at", "-id")
+        factory = APIRequestFactory()
+        depths = [d for d in (int(x) for x in opts["depths"].split(",")) if d < total]
+
+        self.stdout.write(f"{total} notificações, páginas de {page_size} (mediana de {opts['repeat']} execuções)")
+        self.stdout.write(f"{'profundidade':>12} {'cursor ms':>10} {'offset ms':>10}")
+        for depth in depths:
+            # posição do cursor nessa profundidade (calculada fora da medição)
+            params = {"page_size": page_size}
+            if depth:
+                paginator = CreatedAtCursorPagination()
+                paginator.base_url = "http://bench/"
+                position = ordered.values_list("created_at", flat=True)[depth]
+                url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=str(position)))
+                params["cursor"] = parse_qs(urlparse(url).query)["cursor"][0]
+            request = Request(factory.get("/", params))
+
+            def by_cursor():
+                CreatedAtCursorPagination().paginate_queryset(qs, request)
+
+            def by_offset():
+                list(ordered[depth:depth + page_size])
+
+            self.stdout.write(
+                f"{depth:>12} {self._timed(by_cursor, opts['repeat']):>10.2f} "
+                f"{self._timed(by_offset, opts['repeat']):>10.2f}"
+            )
+
+        if opts["explain"] and depths:
+            position = ordered.values_list("created_at", flat=True)[depths[-1]]
+            self.stdout.write(ordered.filter(created_at__lt=position)[:page_size].explain())
+
+        if opts["cleanup"]:
+            qs.delete()
+            user.delete()
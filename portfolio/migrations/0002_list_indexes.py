@@ -0,0 +1,39 @@
+# Generated by Django 5.0.3 on 2026-10-18 08:04
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY não roda dentro de transação e não trava as
+    # tabelas para escrita (notifications/alerts podem ser grandes)
+    atomic = False
+
+    dependencies = [
+        ('portfolio', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='fav_user_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='notif_user_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='portfolioholding',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='holding_user_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='pricealert',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', '-created_at', '-id'], name='alert_user_active_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='pricealert',
+            index=models.Index(condition=models.Q(('is_active', True), ('triggered', False)), fields=['coin_id', 'target_price_usd'], name='alert_pending_coin_idx'),
+        ),
+    ]
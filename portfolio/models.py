@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.conf import settings
 import uuid
 
@@ -15,6 +16,7 @@ class Favorite(models.Model):
     class Meta:
         unique_together = ("user","coin_id")
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["user", "-created_at", "-id"], name="fav_user_created_idx")]
 
 class PortfolioHolding(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -30,6 +32,7 @@ class PortfolioHolding(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     class Meta:
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["user", "-created_at", "-id"], name="holding_user_created_idx")]
 
 class PriceAlert(models.Model):
     CONDITION_CHOICES = [("above","Above"),("below","Below")]
@@ -46,6 +49,14 @@ class PriceAlert(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # AlertListCreate: alertas ativos do usuário, paginados por created_at
+            models.Index(fields=["user", "-created_at", "-id"], condition=Q(is_active=True),
+                         name="alert_user_active_idx"),
+            # check_price_alerts / fire_alerts_for_prices: pendentes por moeda e alvo
+            models.Index(fields=["coin_id", "target_price_usd"], condition=Q(is_active=True, triggered=False),
+                         name="alert_pending_coin_idx"),
+        ]
 
 class Notification(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -58,3 +69,4 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     class Meta:
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["user", "-created_at", "-id"], name="notif_user_created_idx")]
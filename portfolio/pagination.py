@@ -0,0 +1,15 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Paginação keyset (?cursor=) pela ordem padrão dos modelos do app
+    (-created_at, com -id de desempate). Cada página é um
+    WHERE created_at < <posição> ... LIMIT n coberto pelos índices
+    (user, -created_at, -id): custo constante em qualquer profundidade.
+    """
+    ordering = ("-created_at", "-id")
+    page_size = int(getattr(settings, "API_PAGE_SIZE", 50))
+    page_size_query_param = "page_size"
+    max_page_size = 200
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Favorite, PortfolioHolding, PriceAlert, Notification
-from coins.services import coingecko
+from .services.valuation import holding_values
+from coins.services import prices, catalog
 
 class FavoriteSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,12 +10,12 @@ class FavoriteSerializer(serializers.ModelSerializer):
         read_only_fields = ("id","user","coin_name","coin_symbol","coin_image","created_at")
 
     def create(self, validated_data):
-        # Enriquecer com dados da moeda
-        d = coingecko.coin_detail(validated_data["coin_id"])
+        # Enriquecer com dados da moeda (catálogo local, fallback CoinGecko)
+        info = catalog.coin_info(validated_data["coin_id"])
         validated_data["user"] = self.context["request"].user
-        validated_data["coin_name"] = d.get("name")
-        validated_data["coin_symbol"] = d.get("symbol")
-        validated_data["coin_image"] = (d.get("image") or {}).get("small") or (d.get("image") or {}).get("thumb")
+        validated_data["coin_name"] = info["name"]
+        validated_data["coin_symbol"] = info["symbol"]
+        validated_data["coin_image"] = info["image"]
         return super().create(validated_data)
 
 class HoldingSerializer(serializers.ModelSerializer):
@@ -31,34 +32,43 @@ class HoldingSerializer(serializers.ModelSerializer):
                             "current_price_usd","invested_value_usd","current_value_usd","profit_usd","profit_percentage")
 
     def _price(self, obj):
-        d = coingecko.coin_detail(obj.coin_id)
-        return d.get("market_data",{}).get("current_price",{}).get("usd")
+        # Mapa de preços pré-resolvido pela view (context["prices"]); se não
+        # existir, resolve sob demanda e memoriza no próprio context.
+        price_map = self.context.get("prices")
+        if price_map is None:
+            price_map = self.context["prices"] = prices.PriceMap()
+        if obj.coin_id not in price_map:
+            price_map.update(prices.resolve_prices([obj.coin_id]))
+        return price_map.get(obj.coin_id)
+
+    def _values(self, obj):
+        # os cinco campos calculados saem de uma conta só, memorizada por holding
+        memo = self.context.setdefault("holding_values", {})
+        if obj.pk not in memo:
+            memo[obj.pk] = holding_values(obj.amount, obj.purchase_price_usd, self._price(obj))
+        return memo[obj.pk]
 
     def get_current_price_usd(self, obj):
-        p = self._price(obj); return float(p) if p else None
+        return self._values(obj)["current_price_usd"]
 
     def get_invested_value_usd(self, obj):
-        return float(obj.amount * obj.purchase_price_usd)
+        return self._values(obj)["invested_value_usd"]
 
     def get_current_value_usd(self, obj):
-        p = self._price(obj); 
-        return float(obj.amount) * float(p) if p else None
+        return self._values(obj)["current_value_usd"]
 
     def get_profit_usd(self, obj):
-        cv = self.get_current_value_usd(obj); iv = self.get_invested_value_usd(obj)
-        return None if cv is None else float(cv - iv)
+        return self._values(obj)["profit_usd"]
 
     def get_profit_percentage(self, obj):
-        iv = self.get_invested_value_usd(obj)
-        prof = self.get_profit_usd(obj)
-        return None if prof is None or iv == 0 else float(100.0 * prof / iv)
+        return self._values(obj)["profit_percentage"]
 
     def create(self, validated_data):
-        d = coingecko.coin_detail(validated_data["coin_id"])
+        info = catalog.coin_info(validated_data["coin_id"])
         validated_data["user"] = self.context["request"].user
-        validated_data["coin_name"] = d.get("name")
-        validated_data["coin_symbol"] = d.get("symbol")
-        validated_data["coin_image"] = (d.get("image") or {}).get("small") or (d.get("image") or {}).get("thumb")
+        validated_data["coin_name"] = info["name"]
+        validated_data["coin_symbol"] = info["symbol"]
+        validated_data["coin_image"] = info["image"]
         return super().create(validated_data)
 
 class PriceAlertSerializer(serializers.ModelSerializer):
@@ -68,10 +78,10 @@ class PriceAlertSerializer(serializers.ModelSerializer):
         read_only_fields = ("id","user","triggered","triggered_at","created_at")
 
     def create(self, validated_data):
-        d = coingecko.coin_detail(validated_data["coin_id"])
+        info = catalog.coin_info(validated_data["coin_id"])
         validated_data["user"] = self.context["request"].user
-        validated_data["coin_name"] = d.get("name")
-        validated_data["coin_symbol"] = d.get("symbol")
+        validated_data["coin_name"] = info["name"]
+        validated_data["coin_symbol"] = info["symbol"]
         return super().create(validated_data)
 
 class NotificationSerializer(serializers.ModelSerializer):
@@ -0,0 +1,183 @@
+import uuid
+import logging
+from bisect import bisect_right
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.utils import timezone
+
+from portfolio.models import PriceAlert
+from coins.services import cache
+
+logger = logging.getLogger(__name__)
+
+# Índice de limites dos alertas, por moeda.
+# Persistência (Redis, compartilhada entre web e workers):
+#   ct:alerts:above:<coin_id>  zset alert_id -> alvo
+#   ct:alerts:below:<coin_id>  zset alert_id -> alvo
+#   ct:alerts:coins            set de moedas com alertas indexados
+#   ct:alerts:ver              hash coin_id -> versão (incrementa a cada mutação)
+# Em memória (por processo): por moeda, arrays ordenados "above" (alvo crescente)
+# e "below" (alvo decrescente); um bisect devolve exatamente os alertas atingidos.
+# Cada processo recarrega só as moedas cuja versão mudou no Redis.
+NS = "alerts"
+REBUILD_BATCH = 5000
+REBUILD_TMP_TTL = 3600  # s; chaves temporárias de uma reconstrução abandonada
+REBUILD_OVERLAP = 60    # s; folga (relógios) ao reindexar alertas criados durante a reconstrução
+
+_Side = Tuple[List[float], List[str]]
+
+
+def _zkey(condition: str, coin_id: str) -> str:
+    return cache.key(NS, condition, coin_id)
+
+
+class AlertIndex:
+    def __init__(self):
+        self._above: Dict[str, _Side] = {}  # alvos crescentes
+        self._below: Dict[str, _Side] = {}  # alvos decrescentes (guardados negados)
+        self._versions: Dict[str, int] = {}
+
+    # ---- leitura -------------------------------------------------------
+
+    def _load(self, coin_ids: List[str], versions: List[Optional[int]]) -> None:
+        r = cache.client()
+        pipe = r.pipeline(transaction=False)
+        for cid in coin_ids:
+            pipe.zrange(_zkey("above", cid), 0, -1, withscores=True)
+            pipe.zrange(_zkey("below", cid), 0, -1, desc=True, withscores=True)
+        rows = pipe.execute()
+        for n, cid in enumerate(coin_ids):
+            above, below = rows[2 * n], rows[2 * n + 1]
+            self._above[cid] = ([s for _, s in above], [m.decode() for m, _ in above])
+            self._below[cid] = ([-s for _, s in below], [m.decode() for m, _ in below])
+            self._versions[cid] = versions[n]
+
+    def sync(self, coin_ids: Iterable[str]) -> None:
+        """Recarrega do Redis as moedas cuja versão mudou desde a última leitura."""
+        coin_ids = list(coin_ids)
+        if not coin_ids:
+            return
+        raw = cache.client().hmget(cache.key(NS, "ver"), coin_ids)
+        versions = [int(v) if v else None for v in raw]
+        stale = [(cid, v) for cid, v in zip(coin_ids, versions)
+                 if cid not in self._versions or self._versions[cid] != v]
+        if stale:
+            self._load([c for c, _ in stale], [v for _, v in stale])
+
+    def match(self, coin_id: str, price: float) -> List[str]:
+        """Ids dos alertas atingidos por 'price' (above: alvo <= preço; below: alvo >= preço)."""
+        out: List[str] = []
+        above = self._above.get(coin_id)
+        if above:
+            out.extend(above[1][:bisect_right(above[0], price)])
+        below = self._below.get(coin_id)
+        if below:
+            out.extend(below[1][:bisect_right(below[0], -price)])
+        return out
+
+    def match_many(self, price_map: Dict[str, Optional[float]]) -> List[str]:
+        coin_ids = [c for c, p in price_map.items() if p is not None]
+        self.sync(coin_ids)
+        out: List[str] = []
+        for cid in coin_ids:
+            out.extend(self.match(cid, float(price_map[cid])))
+        return out
+
+
+_INDEX = AlertIndex()
+
+
+def get_index() -> AlertIndex:
+    return _INDEX
+
+
+# ---- escrita (incremental, direto no Redis) ------------------------------
+
+def add(alert: PriceAlert) -> None:
+    if not alert.is_active or alert.triggered:
+        return
+    pipe = cache.client().pipeline()
+    pipe.zadd(_zkey(alert.condition, alert.coin_id), {str(alert.id): float(alert.target_price_usd)})
+    pipe.sadd(cache.key(NS, "coins"), alert.coin_id)
+    pipe.hincrby(cache.key(NS, "ver"), alert.coin_id, 1)
+    pipe.execute()
+
+
+def discard_many(alerts: Iterable[Any]) -> None:
+    """Remove alertas do índice (aceita PriceAlert ou qualquer objeto com id/coin_id/condition)."""
+    pipe = cache.client().pipeline()
+    coins = set()
+    for a in alerts:
+        pipe.zrem(_zkey(a.condition, a.coin_id), str(a.id))
+        coins.add(a.coin_id)
+    for cid in coins:
+        pipe.hincrby(cache.key(NS, "ver"), cid, 1)
+    if coins:
+        pipe.execute()
+
+
+def discard(alert: PriceAlert) -> None:
+    discard_many([alert])
+
+
+def rebuild_from_db() -> int:
+    """
+    Reconstrói o índice no Redis a partir dos PriceAlert pendentes.
+    Chamado pelo check_price_alerts (rede de segurança contra divergências).
+
+    Monta tudo em chaves temporárias e troca num único MULTI (RENAME por cima
+    das chaves em uso), então quem lê nunca vê o índice vazio ou pela metade.
+    Alertas criados enquanto a reconstrução rodava (o add() deles pode ter sido
+    sobrescrito pela troca) são reindexados logo em seguida.
+    """
+    r = cache.client()
+    started = timezone.now()
+    token = uuid.uuid4().hex
+
+    def tmp(condition: str, coin_id: str) -> str:
+        return cache.key(NS, "rebuild", token, condition, coin_id)
+
+    rows = (PriceAlert.objects.filter(is_active=True, triggered=False).order_by()
+            .values_list("id", "coin_id", "condition", "target_price_usd"))
+    pipe = r.pipeline(transaction=False)
+    built = set()
+    pending = 0
+    count = 0
+    for alert_id, coin_id, condition, target in rows.iterator(chunk_size=REBUILD_BATCH):
+        pipe.zadd(tmp(condition, coin_id), {str(alert_id): float(target)})
+        if (condition, coin_id) not in built:
+            built.add((condition, coin_id))
+            # se o processo morrer no meio, as temporárias somem sozinhas
+            pipe.expire(tmp(condition, coin_id), REBUILD_TMP_TTL)
+        count += 1
+        pending += 1
+        if pending >= REBUILD_BATCH:
+            pipe.execute()
+            pending = 0
+    pipe.execute()
+
+    coins = {cid for _, cid in built}
+    old_coins = {c.decode() for c in r.smembers(cache.key(NS, "coins"))}
+    pipe = r.pipeline()  # MULTI/EXEC
+    for cid in coins | old_coins:
+        for condition in ("above", "below"):
+            if (condition, cid) in built:
+                pipe.rename(tmp(condition, cid), _zkey(condition, cid))
+                pipe.persist(_zkey(condition, cid))
+            else:
+                pipe.delete(_zkey(condition, cid))
+    pipe.delete(cache.key(NS, "coins"))
+    if coins:
+        pipe.sadd(cache.key(NS, "coins"), *coins)
+    for cid in coins | old_coins:
+        pipe.hincrby(cache.key(NS, "ver"), cid, 1)
+    pipe.execute()
+
+    late = PriceAlert.objects.filter(
+        is_active=True, triggered=False, created_at__gte=started - timedelta(seconds=REBUILD_OVERLAP),
+    ).only("id", "coin_id", "condition", "target_price_usd", "is_active", "triggered")
+    for alert in late:
+        add(alert)
+    logger.info("alert index rebuilt: %d alertas em %d moedas", count, len(coins))
+    return count
@@ -0,0 +1,155 @@
+import time
+import logging
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from portfolio.models import PriceAlert, Notification
+from coins.services import prices
+from . import alert_index, notify
+
+logger = logging.getLogger(__name__)
+
+BULK_BATCH = 1000
+
+_ALERT_FIELDS = ("id", "user_id", "coin_id", "coin_name", "coin_symbol", "condition", "target_price_usd")
+
+
+def _pending():
+    # order_by() limpa o ordering padrão (-created_at), senão o distinct() não agrupa
+    return PriceAlert.objects.filter(is_active=True, triggered=False).order_by()
+
+
+def _build_notification(alert: PriceAlert, price: float) -> Notification:
+    return Notification(
+        user_id=alert.user_id,
+        type="price_alert",
+        title=f"Alerta de preço — {alert.coin_symbol.upper()}",
+        message=(
+            f"{alert.coin_name} ({alert.coin_symbol.upper()}) "
+            f"atingiu ${price:.2f} (alvo: {alert.condition} ${float(alert.target_price_usd):.2f})"
+        ),
+        data={
+            "coin_id": alert.coin_id,
+            "coin_symbol": alert.coin_symbol,
+            "current_price_usd": float(price),
+            "target_price_usd": float(alert.target_price_usd),
+            "condition": alert.condition,
+        },
+        read=False,
+    )
+
+
+def evaluate(price_map: Dict[str, Optional[float]]) -> List[PriceAlert]:
+    """
+    Fase 2: um único filtro por moeda devolve os alertas atingidos
+    (above: alvo <= preço; below: alvo >= preço).
+    """
+    hits: List[PriceAlert] = []
+    for coin_id, price in price_map.items():
+        if price is None:
+            continue
+        p = Decimal(str(price))
+        hits.extend(
+            _pending()
+            .filter(coin_id=coin_id)
+            .filter(Q(condition="above", target_price_usd__lte=p) | Q(condition="below", target_price_usd__gte=p))
+            .only(*_ALERT_FIELDS)
+        )
+    return hits
+
+
+def trigger(alerts: Iterable[PriceAlert], price_map: Dict[str, Optional[float]]) -> int:
+    """
+    Fase 3: grava em lote — bulk_create das Notifications e um único update()
+    dos alertas. As linhas são travadas (skip_locked) para que duas execuções
+    concorrentes não notifiquem o mesmo alerta duas vezes.
+    Retorna quantos alertas foram efetivamente disparados.
+    """
+    by_id = {a.id: a for a in alerts}
+    if not by_id:
+        return 0
+    now = timezone.now()
+    fired = 0
+    ids = list(by_id)
+    for i in range(0, len(ids), BULK_BATCH):
+        chunk = ids[i:i + BULK_BATCH]
+        with transaction.atomic():
+            locked = list(
+                _pending().select_for_update(skip_locked=True)
+                .filter(id__in=chunk).values_list("id", flat=True)
+            )
+            if not locked:
+                continue
+            created = Notification.objects.bulk_create(
+                [_build_notification(by_id[aid], price_map[by_id[aid].coin_id]) for aid in locked],
+                batch_size=BULK_BATCH,
+            )
+            # Se preferir manter ativo para novo disparo futuro, não desative:
+            PriceAlert.objects.filter(id__in=locked).update(triggered=True, triggered_at=now, is_active=False)
+            fired += len(locked)
+        alert_index.discard_many(by_id[aid] for aid in locked)
+        # já commitado: entrega em tempo real (quem não estiver conectado lê do banco)
+        try:
+            notify.publish(created)
+        except Exception as exc:
+            logger.warning("falha ao publicar %d notificação(ões) (%s)", len(created), exc)
+    return fired
+
+
+def run_for_prices(price_map: Dict[str, Optional[float]]) -> Dict[str, Any]:
+    """
+    Caminho rápido para um tick de preços: o índice ordenado devolve direto os
+    ids atingidos (bisect por moeda), sem varrer a tabela de alertas.
+    """
+    t0 = time.perf_counter()
+    ids = alert_index.get_index().match_many(price_map)
+    t1 = time.perf_counter()
+    hits = list(_pending().filter(id__in=ids).only(*_ALERT_FIELDS)) if ids else []
+    fired = trigger(hits, price_map)
+    t2 = time.perf_counter()
+    stats = {
+        "coins": len(price_map),
+        "matched": len(ids),
+        "triggered": fired,
+        "match_ms": round((t1 - t0) * 1000, 3),
+        "write_ms": round((t2 - t1) * 1000, 1),
+    }
+    logger.info("fire_alerts_for_prices: %s", stats)
+    return stats
+
+
+def run() -> Dict[str, Any]:
+    """
+    Avalia todos os alertas ativos:
+    1) agrupa por coin_id e resolve cada preço uma única vez (snapshot/bulk);
+       com a CoinGecko fora (ou o circuito aberto), avalia só as moedas que o
+       snapshot resolveu e pula as demais até a próxima execução;
+    2) avalia os limites em lote, um filtro por moeda;
+    3) grava Notifications e alertas disparados em lote.
+    Retorna as métricas da execução (tempos em ms).
+    """
+    t0 = time.perf_counter()
+    coin_ids = list(_pending().values_list("coin_id", flat=True).distinct())
+    price_map = prices.resolve_prices(coin_ids, partial=True)
+    t1 = time.perf_counter()
+    hits = evaluate(price_map)
+    t2 = time.perf_counter()
+    fired = trigger(hits, price_map)
+    t3 = time.perf_counter()
+
+    stats = {
+        "coins": len(coin_ids),
+        "skipped": sum(1 for p in price_map.values() if p is None),
+        "matched": len(hits),
+        "triggered": fired,
+        "fetch_ms": round((t1 - t0) * 1000, 1),
+        "evaluate_ms": round((t2 - t1) * 1000, 1),
+        "write_ms": round((t3 - t2) * 1000, 1),
+        "total_ms": round((t3 - t0) * 1000, 1),
+    }
+    logger.info("check_price_alerts: %s", stats)
+    return stats
@@ -0,0 +1,76 @@
+import os
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from portfolio.serializers import NotificationSerializer
+from coins.services import cache
+
+logger = logging.getLogger(__name__)
+
+# Entrega em tempo real das Notifications:
+#   ct:notify:<user_id>   Redis stream (XADD) com as notificações serializadas;
+#                         o id da entrada é o id do evento SSE (Last-Event-ID)
+#   CHANNEL               pub/sub {user_id: id} que acorda os streams abertos
+# O stream de cada usuário guarda as últimas STREAM_MAXLEN entradas e expira
+# STREAM_TTL s depois da última; o histórico completo continua no banco.
+NS = "notify"
+CHANNEL = cache.key("stream", "notifications")
+STREAM_MAXLEN = int(os.getenv("NOTIFY_STREAM_MAXLEN", "500"))
+STREAM_TTL = int(os.getenv("NOTIFY_STREAM_TTL", str(7 * 24 * 3600)))
+READ_BATCH = 100
+
+
+def _stream_key(user_id) -> str:
+    return cache.key(NS, str(user_id))
+
+
+def _parse_id(event_id: str) -> Optional[Tuple[int, int]]:
+    ms, _, seq = (event_id or "").partition("-")
+    try:
+        return int(ms), int(seq or 0)
+    except ValueError:
+        return None
+
+
+def valid_id(event_id: Optional[str]) -> bool:
+    return _parse_id(event_id) is not None
+
+
+def publish(notifications: Iterable[Any]) -> None:
+    """Anexa as Notifications (já gravadas) ao stream de cada usuário e acorda os streams."""
+    notifications = list(notifications)
+    if not notifications:
+        return
+    rows = NotificationSerializer(notifications, many=True).data
+    r = cache.client()
+    pipe = r.pipeline(transaction=False)
+    users = {}
+    for n, row in zip(notifications, rows):
+        key = _stream_key(n.user_id)
+        # 'user' sai do serializer como UUID
+        pipe.xadd(key, {"data": json.dumps(row, cls=DjangoJSONEncoder)}, maxlen=STREAM_MAXLEN, approximate=True)
+        pipe.expire(key, STREAM_TTL)
+        users[str(n.user_id)] = 1
+    pipe.publish(CHANNEL, json.dumps(users))
+    pipe.execute()
+
+
+def tail_id(user_id) -> str:
+    """Id da última entrada do stream ("0-0" se vazio): ponto de partida sem Last-Event-ID."""
+    last = cache.client().xrevrange(_stream_key(user_id), count=1)
+    return last[0][0].decode() if last else "0-0"
+
+
+def trimmed_since(user_id, last_id: str) -> bool:
+    """True se entradas posteriores a last_id podem ter sido descartadas (MAXLEN)."""
+    first = cache.client().xrange(_stream_key(user_id), count=1)
+    return bool(first) and _parse_id(first[0][0].decode()) > _parse_id(last_id)
+
+
+def read_after(user_id, last_id: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Entradas com id > last_id, em ordem: [(id, notificação), ...]."""
+    entries = cache.client().xrange(_stream_key(user_id), min=f"({last_id}", count=READ_BATCH)
+    return [(eid.decode(), json.loads(fields[b"data"])) for eid, fields in entries]
@@ -0,0 +1,212 @@
+import os
+import json
+import logging
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from portfolio.models import PortfolioHolding
+from coins.services import cache, prices
+
+logger = logging.getLogger(__name__)
+
+# Valuation materializada por usuário (o payload do GET /api/portfolio/ pronto):
+#   ct:valuation:user:<user_id>     json {"summary": {...}, "prices": {coin_id: preço usado}}
+#   ct:valuation:holders:<coin_id>  set de user_ids com posição na moeda
+#   ct:valuation:coins              set de moedas com alguma posição
+# É descartada quando as holdings do usuário mudam (o próximo GET reconstrói
+# do DB + preços) e só reavaliada (sem DB) quando o preço de uma moeda que ele
+# tem muda num tick.
+# O TTL não é renovado pelos ticks: um usuário inativo sai do cache sozinho.
+NS = "valuation"
+TTL = int(os.getenv("PORTFOLIO_VALUATION_TTL", "900"))
+# Valuation montada com preço vencido (CoinGecko fora): vive pouco, para o
+# próximo GET depois da volta do upstream reconstruir com preço fresco.
+STALE_TTL = 60
+
+
+def _user_key(user_id) -> str:
+    return cache.key(NS, "user", str(user_id))
+
+
+def _holders_key(coin_id: str) -> str:
+    return cache.key(NS, "holders", coin_id)
+
+
+def holding_values(amount, purchase_price, price) -> Dict[str, Optional[float]]:
+    """Campos calculados de uma holding (usados pelo serializer e pela reavaliação)."""
+    invested = float(Decimal(str(amount)) * Decimal(str(purchase_price)))
+    current = float(amount) * float(price) if price else None
+    profit = None if current is None else current - invested
+    return {
+        "current_price_usd": float(price) if price else None,
+        "invested_value_usd": invested,
+        "current_value_usd": current,
+        "profit_usd": profit,
+        "profit_percentage": None if profit is None or invested == 0 else 100.0 * profit / invested,
+    }
+
+
+def _totals(rows: List[Dict[str, Any]]) -> Dict[str, float]:
+    total_invested = sum(r["invested_value_usd"] for r in rows)
+    total_current = sum(r["current_value_usd"] or 0.0 for r in rows)
+    profit = total_current - total_invested
+    pct = (profit / total_invested * 100.0) if total_invested else 0.0
+    return {
+        "total_value_usd": round(total_current, 2),
+        "total_invested_usd": round(total_invested, 2),
+        "total_profit_usd": round(profit, 2),
+        "total_profit_percentage": round(pct, 2),
+    }
+
+
+def summarize(holdings, price_map: Dict[str, Optional[float]]) -> Dict[str, Any]:
+    """Resumo do portfólio (totais + holdings) a partir de um mapa de preços já resolvido."""
+    from portfolio.serializers import HoldingSerializer  # serializers importa este módulo
+
+    rows = HoldingSerializer(holdings, many=True, context={"prices": price_map}).data
+    # stale: algum preço é o último conhecido (upstream indisponível), não o atual
+    return {**_totals(rows), "stale": bool(getattr(price_map, "stale", None)), "holdings": rows}
+
+
+def _store(user_id, summary: Dict[str, Any], price_map: Dict[str, Optional[float]]) -> None:
+    r = cache.client()
+    key = _user_key(user_id)
+    old = r.get(key)
+    held = {row["coin_id"] for row in summary["holdings"]}
+    gone = set(json.loads(old)["prices"]) - held if old else set()
+    stale = sorted(set(getattr(price_map, "stale", ())) & held)
+    doc = {"summary": summary, "prices": {c: price_map.get(c) for c in held}, "stale": stale}
+    pipe = r.pipeline(transaction=False)
+    # o HoldingSerializer devolve o 'user' como UUID
+    pipe.set(key, json.dumps(doc, cls=DjangoJSONEncoder), ex=STALE_TTL if stale else TTL)
+    for cid in held:
+        pipe.sadd(_holders_key(cid), str(user_id))
+    for cid in gone:
+        pipe.srem(_holders_key(cid), str(user_id))
+    if held:
+        pipe.sadd(cache.key(NS, "coins"), *held)
+    pipe.execute()
+
+
+def get(user_id) -> Optional[Dict[str, Any]]:
+    """Resumo materializado do usuário ou None (miss)."""
+    raw = cache.client().get(_user_key(user_id))
+    return json.loads(raw)["summary"] if raw else None
+
+
+def rebuild(user_id) -> Dict[str, Any]:
+    """Recalcula a valuation do usuário a partir do banco e grava no cache."""
+    holdings = list(PortfolioHolding.objects.filter(user_id=user_id))
+    price_map = prices.resolve_prices(h.coin_id for h in holdings)
+    summary = summarize(holdings, price_map)
+    _store(user_id, summary, price_map)
+    return summary
+
+
+async def arebuild(user_id) -> Dict[str, Any]:
+    """Versão async de rebuild (preços faltantes via cliente async)."""
+    holdings = [h async for h in PortfolioHolding.objects.filter(user_id=user_id)]
+    price_map = await prices.aresolve_prices(h.coin_id for h in holdings)
+    summary = await sync_to_async(summarize)(holdings, price_map)
+    await sync_to_async(_store)(user_id, summary, price_map)
+    return summary
+
+
+def get_or_build(user_id) -> Dict[str, Any]:
+    return get(user_id) or rebuild(user_id)
+
+
+def _revalue(doc: Dict[str, Any], price_map: Dict[str, Optional[float]]) -> None:
+    rows = doc["summary"]["holdings"]
+    for row in rows:
+        row.update(holding_values(row["amount"], row["purchase_price_usd"], price_map.get(row["coin_id"])))
+    doc["summary"].update(_totals(rows))
+    doc["prices"] = {row["coin_id"]: price_map.get(row["coin_id"]) for row in rows}
+
+
+# Compare-and-set: só regrava se a valuation ainda é a que foi lida no MGET.
+# Um rebuild (holdings mudaram) que gravou no meio vence: ele já leu o banco
+# e os preços atuais, e regravar o doc antigo traria de volta holdings velhas.
+_CAS_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  redis.call('SET', KEYS[1], ARGV[2], 'KEEPTTL')
+  return 1
+end
+return 0
+"""
+
+
+def revalue(price_map: Dict[str, Optional[float]]) -> int:
+    """
+    Reavalia, sem tocar no banco, as valuations dos usuários que têm alguma
+    moeda cujo preço mudou neste tick. Retorna quantas foram regravadas.
+    """
+    r = cache.client()
+    cas = r.register_script(_CAS_LUA)
+    coins = [c for c, p in price_map.items() if p is not None]
+    if not coins:
+        return 0
+    held = r.smismember(cache.key(NS, "coins"), coins)
+    coins = [c for c, h in zip(coins, held) if h]
+    if not coins:
+        return 0
+
+    pipe = r.pipeline(transaction=False)
+    for cid in coins:
+        pipe.smembers(_holders_key(cid))
+    users = sorted({u.decode() for members in pipe.execute() for u in members})
+
+    updated = 0
+    for start in range(0, len(users), 500):
+        batch = users[start:start + 500]
+        docs = r.mget([_user_key(u) for u in batch])
+        pipe = r.pipeline(transaction=False)
+        writes = []  # posições dos CAS no pipeline (os SREM também retornam 1)
+        for uid, raw in zip(batch, docs):
+            if raw is None:
+                # valuation expirou: tira o usuário dos índices destas moedas
+                for cid in coins:
+                    pipe.srem(_holders_key(cid), uid)
+                continue
+            doc = json.loads(raw)
+            ticked = {c for c in doc["prices"] if price_map.get(c) is not None}
+            merged = {**doc["prices"], **{c: price_map[c] for c in ticked}}
+            stale = set(doc.get("stale", ()))
+            if merged == doc["prices"] and not stale & ticked:
+                continue
+            _revalue(doc, merged)
+            doc["stale"] = sorted(stale - ticked)
+            doc["summary"]["stale"] = bool(doc["stale"])
+            writes.append(len(pipe))
+            cas(keys=[_user_key(uid)], args=[raw, json.dumps(doc, cls=DjangoJSONEncoder)], client=pipe)
+        results = pipe.execute()
+        updated += sum(1 for i in writes if results[i] == 1)
+    return updated
+
+
+def holdings_changed(user_id) -> None:
+    """
+    Hook dos caminhos de escrita de holdings: depois do commit só descarta a
+    valuation; o próximo GET reconstrói. Reconstruir aqui poria leituras do
+    banco e talvez uma busca de preço dentro de cada POST/PATCH/DELETE.
+    """
+    transaction.on_commit(lambda: invalidate(user_id))
+
+
+def invalidate(user_id) -> None:
+    """Descarta a valuation do usuário e tira ele dos índices das moedas que ela tinha."""
+    try:
+        r = cache.client()
+        key = _user_key(user_id)
+        old = r.get(key)
+        pipe = r.pipeline(transaction=False)
+        pipe.delete(key)
+        for cid in json.loads(old)["prices"] if old else ():
+            pipe.srem(_holders_key(cid), str(user_id))
+        pipe.execute()
+    except Exception as exc:
+        logger.warning("falha ao descartar valuation de %s (%s)", user_id, exc)
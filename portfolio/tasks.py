@@ -1,60 +1,34 @@
 # portfolio/tasks.py
 from celery import shared_task
-from django.utils import timezone
-from django.db import transaction
 
-from .models import PriceAlert, Notification
-from coins.services import coingecko  
+from .services import alerts, alert_index, valuation
+from coins.services import ratelimit
 
 @shared_task(name="portfolio.tasks.check_price_alerts")
 def check_price_alerts():
     """
-    Varre alerts ativos, busca preço atual no coingecko e dispara notificação
-    quando o alvo é atingido. Marca 'triggered' e desativa se for o caso.
+    Varre alerts ativos, busca o preço atual de cada moeda uma única vez e
+    dispara notificações em lote quando o alvo é atingido. Marca 'triggered'
+    e desativa o alerta. Retorna as métricas/tempos da execução.
     """
-    alerts = PriceAlert.objects.filter(is_active=True, triggered=False)
-    # Agrupar por coin_id para reduzir chamadas (opcional: melhorar com cache)
-    for alert in alerts:
-        try:
-            data = coingecko.coin_detail(alert.coin_id)
-            price = (data.get("market_data", {})
-                        .get("current_price", {})
-                        .get("usd"))
-            if price is None:
-                continue
+    with ratelimit.priority(ratelimit.BACKGROUND):
+        stats = alerts.run()
+    # Varredura completa também serve para ressincronizar o índice ordenado
+    stats["indexed"] = alert_index.rebuild_from_db()
+    return stats
 
-            hit = (
-                (alert.condition == "above" and float(price) >= float(alert.target_price_usd))
-                or
-                (alert.condition == "below" and float(price) <= float(alert.target_price_usd))
-            )
+@shared_task(name="portfolio.tasks.fire_alerts_for_prices")
+def fire_alerts_for_prices(price_map):
+    """
+    Disparo imediato a cada tick de preços ({coin_id: preço}), via índice
+    ordenado de alvos — não espera o próximo check_price_alerts.
+    """
+    return alerts.run_for_prices(price_map)
 
-            if hit:
-                with transaction.atomic():
-                    # cria notificação
-                    Notification.objects.create(
-                        user=alert.user,
-                        type="price_alert",
-                        title=f"Alerta de preço — {alert.coin_symbol.upper()}",
-                        message=(
-                            f"{alert.coin_name} ({alert.coin_symbol.upper()}) "
-                            f"atingiu ${price:.2f} (alvo: {alert.condition} ${float(alert.target_price_usd):.2f})"
-                        ),
-                        data={
-                            "coin_id": alert.coin_id,
-                            "coin_symbol": alert.coin_symbol,
-                            "current_price_usd": float(price),
-                            "target_price_usd": float(alert.target_price_usd),
-                            "condition": alert.condition,
-                        },
-                        read=False,
-                    )
-                    # marca como disparado
-                    alert.triggered = True
-                    alert.triggered_at = timezone.now()
-                    # Se preferir manter ativo para novo disparo futuro, não desative:
-                    alert.is_active = False
-                    alert.save(update_fields=["triggered", "triggered_at", "is_active"])
-        except Exception:
-            # Evita derrubar a task inteira por 1 erro; poderia logar aqui
-            continue
+@shared_task(name="portfolio.tasks.revalue_portfolios")
+def revalue_portfolios(price_map):
+    """
+    Reavalia as valuations materializadas dos usuários com posição nas moedas
+    cujo preço mudou neste tick ({coin_id: preço}).
+    """
+    return {"revalued": valuation.revalue(price_map)}
@@ -1,3 +1,243 @@
-from django.test import TestCase
+import json
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from coins.models import CoinMetadata
+from coins.services import cache, coingecko, prices
+from portfolio.models import PortfolioHolding, PriceAlert
+from portfolio.services import alert_index, alerts, notify, valuation
+
+try:
+    import fakeredis
+except ImportError:  # requirements-dev.txt
+    fakeredis = None
+
+
+def _summary(holdings, price_map):
+    rows = [
+        {"coin_id": cid, "amount": amount, "purchase_price_usd": 100.0,
+         **valuation.holding_values(amount, 100.0, price_map.get(cid))}
+        for cid, amount in holdings
+    ]
+    return {**valuation._totals(rows), "holdings": rows}
+
+
+@skipUnless(fakeredis, "fakeredis[lua] não instalado")
+class RevalueRaceTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        patcher = mock.patch.object(cache, "_redis", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _doc(self, user_id):
+        return json.loads(self.redis.get(valuation._user_key(user_id)))
+
+    def test_revalue_updates_prices(self):
+        valuation._store(1, _summary([("bitcoin", 1.0)], {"bitcoin": 100.0}), {"bitcoin": 100.0})
+        self.assertEqual(valuation.revalue({"bitcoin": 150.0}), 1)
+        self.assertEqual(self._doc(1)["summary"]["total_value_usd"], 150.0)
+
+    def test_rebuild_between_read_and_write_wins(self):
+        prices = {"bitcoin": 100.0}
+        valuation._store(1, _summary([("bitcoin", 1.0)], prices), prices)
+        real_mget = self.redis.mget
+
+        def mget_then_rebuild(keys):
+            docs = real_mget(keys)
+            # holding nova gravada por um rebuild enquanto o tick reavalia
+            rebuilt = {"bitcoin": 100.0, "ethereum": 10.0}
+            valuation._store(1, _summary([("bitcoin", 1.0), ("ethereum", 2.0)], rebuilt), rebuilt)
+            return docs
+
+        with mock.patch.object(self.redis, "mget", side_effect=mget_then_rebuild):
+            self.assertEqual(valuation.revalue({"bitcoin": 150.0}), 0)
+
+        coins = [h["coin_id"] for h in self._doc(1)["summary"]["holdings"]]
+        self.assertEqual(coins, ["bitcoin", "ethereum"])
+        # o próximo tick reavalia o doc novo
+        self.assertEqual(valuation.revalue({"bitcoin": 150.0}), 1)
+        self.assertEqual(self._doc(1)["summary"]["total_value_usd"], 170.0)
+
+
+@skipUnless(fakeredis, "fakeredis[lua] não instalado")
+class StalePricesTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(cache, "_redis", fakeredis.FakeStrictRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_outage_marks_snapshot_prices_stale(self):
+        from coins.services import coingecko, prices
+
+        prices.write_snapshot({"bitcoin": {"price": 100.0}})
+        with mock.patch.object(coingecko, "simple_price", side_effect=coingecko.CircuitOpen(5)):
+            out = prices.resolve_prices(["bitcoin"], max_age=0)
+            self.assertEqual(out, {"bitcoin": 100.0})
+            self.assertEqual(out.stale, {"bitcoin"})
+            with self.assertRaises(coingecko.CircuitOpen):
+                prices.resolve_prices(["ethereum"], max_age=0)
+
+
+class PortfolioUpstreamTests(SimpleTestCase):
+    def _get(self):
+        from types import SimpleNamespace
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from portfolio.views import PortfolioView
+
+        request = APIRequestFactory().get("/api/portfolio/")
+        force_authenticate(request, user=SimpleNamespace(id=1, is_authenticated=True))
+        return PortfolioView.as_view()(request)
+
+    def test_outage_without_known_price_is_503(self):
+        from coins.services import coingecko
+
+        with mock.patch.object(valuation, "get_or_build", side_effect=coingecko.CircuitOpen(7)):
+            resp = self._get()
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp["Retry-After"], "7")
+
+    def test_stale_summary_is_flagged(self):
+        with mock.patch.object(valuation, "get_or_build", return_value={"stale": True, "holdings": []}):
+            resp = self._get()
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("110", resp["Warning"])
+
+
+@skipUnless(fakeredis, "fakeredis[lua] não instalado")
+class AlertIndexRebuildTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        patcher = mock.patch.object(cache, "_redis", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _alert(self, alert_id, coin_id, target, condition="above"):
+        return SimpleNamespace(id=alert_id, coin_id=coin_id, condition=condition, target_price_usd=target,
+                               is_active=True, triggered=False)
+
+    def _ids(self, condition, coin_id):
+        return [m.decode() for m in self.redis.zrange(alert_index._zkey(condition, coin_id), 0, -1)]
+
+    def _rebuild(self, rows, late=()):
+        seen_during_build = []
+
+        def iterate(chunk_size):
+            for row in rows:
+                # leitores concorrentes continuam vendo o índice antigo completo
+                seen_during_build.append(self._ids("above", "bitcoin"))
+                yield row
+
+        snapshot = mock.MagicMock()
+        snapshot.order_by.return_value.values_list.return_value.iterator.side_effect = iterate
+        created_meanwhile = mock.MagicMock()
+        created_meanwhile.only.return_value = list(late)
+        with mock.patch.object(alert_index, "PriceAlert") as model:
+            model.objects.filter.side_effect = [snapshot, created_meanwhile]
+            count = alert_index.rebuild_from_db()
+        return count, seen_during_build
+
+    def test_swap_keeps_index_readable_and_drops_gone_coins(self):
+        alert_index.add(self._alert("a1", "bitcoin", 100))
+        alert_index.add(self._alert("a2", "dogecoin", 1))
+        count, seen = self._rebuild([("a1", "bitcoin", "above", 100), ("a3", "bitcoin", "above", 200)])
+        self.assertEqual(count, 2)
+        self.assertTrue(all(ids == ["a1"] for ids in seen))
+        self.assertEqual(self._ids("above", "bitcoin"), ["a1", "a3"])
+        self.assertEqual(self._ids("above", "dogecoin"), [])
+        self.assertEqual(self.redis.smembers(cache.key(alert_index.NS, "coins")), {b"bitcoin"})
+        self.assertEqual(self.redis.ttl(alert_index._zkey("above", "bitcoin")), -1)
+        self.assertEqual(self.redis.keys(cache.key(alert_index.NS, "rebuild", "*")), [])
+
+    def test_alert_created_during_rebuild_survives_swap(self):
+        late = self._alert("a9", "ethereum", 5, "below")
+        self._rebuild([("a1", "bitcoin", "above", 100)], late=[late])
+        self.assertEqual(self._ids("below", "ethereum"), ["a9"])
+        self.assertIn(b"ethereum", self.redis.smembers(cache.key(alert_index.NS, "coins")))
+
+
+@skipUnless(fakeredis, "fakeredis[lua] não instalado")
+class ValuationRebuildTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        patcher = mock.patch.object(cache, "_redis", self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_user(
+            username="valuation", email="valuation@example.com", password="x")
+        PortfolioHolding.objects.create(
+            user=self.user, coin_id="bitcoin", coin_name="Bitcoin", coin_symbol="btc", coin_image="",
+            amount=Decimal("2"), purchase_price_usd=Decimal("100"), purchase_date=date(2024, 1, 1))
+        prices.write_snapshot({"bitcoin": {"price": 150.0}})
+
+    def test_rebuild_stores_serialized_holdings(self):
+        # o 'user' do HoldingSerializer é um UUID: o doc precisa serializar mesmo assim
+        valuation.rebuild(self.user.id)
+        summary = valuation.get(self.user.id)
+        self.assertEqual(summary["total_value_usd"], 300.0)
+        self.assertEqual(summary["holdings"][0]["user"], str(self.user.id))
+
+    def test_holding_write_drops_valuation_after_commit(self):
+        valuation.rebuild(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            valuation.holdings_changed(self.user.id)
+            self.assertIsNotNone(valuation.get(self.user.id))
+        self.assertIsNone(valuation.get(self.user.id))
+
+    def test_revalue_rewrites_rebuilt_doc(self):
+        valuation.rebuild(self.user.id)
+        self.assertEqual(valuation.revalue({"bitcoin": 200.0}), 1)
+        self.assertEqual(valuation.get(self.user.id)["total_value_usd"], 400.0)
+
+
+@skipUnless(fakeredis, "fakeredis[lua] não instalado")
+class AlertTriggerTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(cache, "_redis", fakeredis.FakeStrictRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_user(
+            username="alerts", email="alerts@example.com", password="x")
+        self.alert = PriceAlert.objects.create(
+            user=self.user, coin_id="bitcoin", coin_name="Bitcoin", coin_symbol="btc",
+            condition="above", target_price_usd=Decimal("100"))
+
+    def test_trigger_publishes_to_notification_stream(self):
+        self.assertEqual(alerts.trigger([self.alert], {"bitcoin": 150.0}), 1)
+        entries = notify.read_after(self.user.id, "0-0")
+        self.assertEqual(len(entries), 1)
+        notification = entries[0][1]
+        self.assertEqual(notification["user"], str(self.user.id))
+        self.assertEqual(notification["data"]["current_price_usd"], 150.0)
+
+
+@skipUnless(fakeredis, "fakeredis[lua] não instalado")
+class HoldingWriteOutageTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(cache, "_redis", fakeredis.FakeStrictRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        outage = mock.patch.object(prices.coingecko, "simple_price", side_effect=coingecko.CircuitOpen(30))
+        outage.start()
+        self.addCleanup(outage.stop)
+        CoinMetadata.objects.create(coin_id="bitcoin", symbol="btc", name="Bitcoin", image="")
+        self.user = get_user_model().objects.create_user(
+            username="writer", email="writer@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_create_succeeds_with_null_price_when_upstream_is_down(self):
+        body = {"coin_id": "bitcoin", "amount": "1.5", "purchase_price_usd": "100", "purchase_date": "2024-01-01"}
+        for path in ("/api/portfolio/holdings/", "/api/portfolio/"):
+            resp = self.client.post(path, body, format="json")
+            self.assertEqual(resp.status_code, 201)
+            self.assertIsNone(resp.json()["current_price_usd"])
+            self.assertTrue(resp["Warning"].startswith("110"))
+        self.assertEqual(PortfolioHolding.objects.filter(user=self.user).count(), 2)
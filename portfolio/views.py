@@ -2,40 +2,71 @@ from rest_framework import generics, permissions, views, response, status
 from django.db.models import Sum, F
 from .models import Favorite, PortfolioHolding, PriceAlert, Notification
 from .serializers import FavoriteSerializer, HoldingSerializer, PriceAlertSerializer, NotificationSerializer
-from coins.services import coingecko
+from .pagination import CreatedAtCursorPagination
+from .services import alert_index, valuation
+from coins.services import cache, coingecko, prices
+from coins.views import stale_warning, upstream_unavailable
 
 
-class PortfolioView(views.APIView):
+class UpstreamAwareMixin:
+    """
+    CoinGecko indisponível e nenhum valor conhecido (preço fora do snapshot,
+    moeda fora do catálogo): 503 com Retry-After, como em coins/ — mas só
+    antes de gravar (ver resolve_written). Se algum preço usado veio do
+    snapshot vencido (ou ficou null), a resposta sai com Warning 110.
+    """
+
+    def price_map(self):
+        if getattr(self, "_price_map", None) is None:
+            self._price_map = prices.PriceMap()
+        return self._price_map
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), "prices": self.price_map()}
+
+    def resolve_written(self, instance):
+        """
+        Preço da holding recém-gravada para a resposta da escrita. A linha já
+        está no banco: um 503 aqui faria o cliente repetir o POST e duplicar a
+        holding, então o preço resolve em modo parcial (vencido ou null, com
+        Warning 110).
+        """
+        self.price_map().update(prices.resolve_prices([instance.coin_id], partial=True))
+
+    def handle_exception(self, exc):
+        if isinstance(exc, coingecko.UpstreamUnavailable):
+            return upstream_unavailable(exc)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "_price_map", None) is not None and self._price_map.stale:
+            stale_warning(response, cache.STALE)
+        return response
+
+
+class PortfolioView(UpstreamAwareMixin, views.APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        holdings = PortfolioHolding.objects.filter(user=request.user)
-        total_invested = sum([float(h.amount * h.purchase_price_usd) for h in holdings])
-        total_current = 0.0
-        for h in holdings:
-            d = coingecko.coin_detail(h.coin_id)
-            p = d.get("market_data", {}).get("current_price", {}).get("usd")
-            if p:
-                total_current += float(h.amount) * float(p)
-        profit = total_current - total_invested
-        pct = (profit / total_invested * 100.0) if total_invested else 0.0
-        return response.Response({
-            "total_value_usd": round(total_current, 2),
-            "total_invested_usd": round(total_invested, 2),
-            "total_profit_usd": round(profit, 2),
-            "total_profit_percentage": round(pct, 2),
-            "holdings": HoldingSerializer(holdings, many=True, context={"request": request}).data
-        })
+        # valuation materializada: uma leitura do cache (reconstruída só num miss)
+        summary = valuation.get_or_build(request.user.id)
+        resp = response.Response(summary)
+        if summary.get("stale"):
+            stale_warning(resp, cache.STALE)
+        return resp
 
     def post(self, request):
-        serializer = HoldingSerializer(data=request.data, context={"request": request})
+        serializer = HoldingSerializer(data=request.data, context={"request": request, "prices": self.price_map()})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        self.resolve_written(serializer.save())
+        valuation.holdings_changed(request.user.id)
         return response.Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class FavoriteListCreate(generics.ListCreateAPIView):
+class FavoriteListCreate(UpstreamAwareMixin, generics.ListCreateAPIView):
     serializer_class = FavoriteSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     def get_queryset(self):
         return Favorite.objects.filter(user=self.request.user)
 
@@ -46,24 +77,42 @@ class FavoriteDelete(generics.DestroyAPIView):
     def get_queryset(self):
         return Favorite.objects.filter(user=self.request.user)
 
-class HoldingListCreate(generics.ListCreateAPIView):
+class HoldingListCreate(UpstreamAwareMixin, generics.ListCreateAPIView):
     serializer_class = HoldingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     def get_queryset(self):
         return PortfolioHolding.objects.filter(user=self.request.user)
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get("many") and args:
+            # preços da página inteira numa chamada bulk, não um resolve por holding
+            self.price_map().update(prices.resolve_prices(h.coin_id for h in args[0]))
+        return super().get_serializer(*args, **kwargs)
+    def perform_create(self, serializer):
+        self.resolve_written(serializer.save())
+        valuation.holdings_changed(self.request.user.id)
 
-class HoldingUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
+class HoldingUpdateDelete(UpstreamAwareMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = HoldingSerializer
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = "id"
     def get_queryset(self):
         return PortfolioHolding.objects.filter(user=self.request.user)
+    def perform_update(self, serializer):
+        self.resolve_written(serializer.save())
+        valuation.holdings_changed(self.request.user.id)
+    def perform_destroy(self, instance):
+        instance.delete()
+        valuation.holdings_changed(self.request.user.id)
 
-class AlertListCreate(generics.ListCreateAPIView):
+class AlertListCreate(UpstreamAwareMixin, generics.ListCreateAPIView):
     serializer_class = PriceAlertSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     def get_queryset(self):
         return PriceAlert.objects.filter(user=self.request.user, is_active=True)
+    def perform_create(self, serializer):
+        alert_index.add(serializer.save())
 
 class AlertDelete(generics.DestroyAPIView):
     serializer_class = PriceAlertSerializer
@@ -71,10 +120,14 @@ class AlertDelete(generics.DestroyAPIView):
     lookup_field = "id"
     def get_queryset(self):
         return PriceAlert.objects.filter(user=self.request.user)
+    def perform_destroy(self, instance):
+        alert_index.discard(instance)
+        instance.delete()
 
 class NotificationList(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user)
 
@@ -0,0 +1,108 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .services import valuation, notify
+from coins.services import cache, coingecko, stream
+from coins.views import stale_warning
+from coins.views_async import upstream_unavailable
+
+
+def _authenticate(request, allow_query_token):
+    jwt = JWTAuthentication()
+    token = request.GET.get("token") if allow_query_token else None
+    if token and not request.headers.get("Authorization"):
+        validated = jwt.get_validated_token(token)
+        return jwt.get_user(validated), validated
+    return jwt.authenticate(request)
+
+
+async def authenticate(request, allow_query_token=False):
+    """
+    Autentica o JWT fora do ciclo do DRF (views async puras).
+    allow_query_token aceita ?token= (EventSource não envia headers).
+    Retorna (user, None) ou (None, JsonResponse 401).
+    """
+    try:
+        auth = await sync_to_async(_authenticate)(request, allow_query_token)
+    except AuthenticationFailed as exc:
+        detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+        return None, JsonResponse(detail, status=401)
+    if auth is None:
+        return None, JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    return auth[0], None
+
+
+@require_GET
+async def portfolio(request):
+    """
+    GET /api/async/portfolio/
+    Mesmo payload (e mesma valuation materializada) do PortfolioView.get;
+    num miss os preços faltantes no snapshot são buscados pelo cliente async.
+    """
+    user, error = await authenticate(request)
+    if error:
+        return error
+    request.user = user
+
+    data = await sync_to_async(valuation.get)(user.id)
+    if data is None:
+        try:
+            data = await valuation.arebuild(user.id)
+        except coingecko.UpstreamUnavailable as exc:
+            return upstream_unavailable(exc)
+    resp = JsonResponse(data)
+    if data.get("stale"):
+        stale_warning(resp, cache.STALE)
+    return resp
+
+
+@require_GET
+async def notification_stream(request):
+    """
+    GET /api/stream/notifications/  (Auth: Bearer ou ?token=)
+    Server-Sent Events com as Notifications do usuário assim que são criadas
+    (evento "notification", id = id no stream Redis). Ao reconectar, o
+    Last-Event-ID (ou ?last_id=) retoma de onde parou; se o trecho já foi
+    descartado, um evento "reset" avisa para recarregar /portfolio/notifications/.
+    """
+    user, error = await authenticate(request, allow_query_token=True)
+    if error:
+        return error
+    last_id = request.headers.get("Last-Event-ID") or request.GET.get("last_id")
+    if not notify.valid_id(last_id):
+        last_id = None
+
+    async def events():
+        hub = stream.get_hub(notify.CHANNEL)
+        # assina antes de ler o stream: nada publicado no meio se perde
+        sub = hub.subscribe([str(user.id)])
+        try:
+            cursor = last_id
+            if cursor is None:
+                cursor = await asyncio.to_thread(notify.tail_id, user.id)
+            elif await asyncio.to_thread(notify.trimmed_since, user.id, cursor):
+                yield stream.sse("reset", {})
+            while True:
+                while True:
+                    entries = await asyncio.to_thread(notify.read_after, user.id, cursor)
+                    for event_id, row in entries:
+                        yield stream.sse("notification", row, event_id)
+                    if entries:
+                        cursor = entries[-1][0]
+                    if len(entries) < notify.READ_BATCH:
+                        break
+                # ocioso até a próxima publicação para este usuário
+                while not await sub.next(stream.HEARTBEAT):
+                    yield b": keep-alive\n\n"
+        finally:
+            hub.unsubscribe(sub)
+
+    resp = StreamingHttpResponse(events(), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"
+    return resp
@@ -27,5 +27,16 @@ def health(request):
     checks["celery_worker"] = "ok"  # simplificado
     checks["celery_beat"] = "ok"
 
+    from coins.services import coingecko, cache, breaker
+    metrics = {"coingecko_pool": coingecko.pool_stats()}
+    try:
+        metrics["coingecko_breaker"] = breaker.stats()
+    except Exception:
+        metrics["coingecko_breaker"] = None
+    try:
+        metrics["cache_single_flight"] = cache.single_flight_stats()
+    except Exception:
+        metrics["cache_single_flight"] = None
+
     return Response({"status":"healthy" if all(v=="ok" for v in checks.values()) else "degraded",
-                     "checks":checks})
+                     "checks":checks, "metrics":metrics})